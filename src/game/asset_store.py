@@ -0,0 +1,67 @@
+import concurrent.futures
+import threading
+from typing import Callable, Iterable
+
+from .task_graph import Milestone
+
+
+class AssetStore:
+    """
+    A future for each generated asset, keyed by story field or image task name, that
+    resolves with the field's value or the image once it's been generated.  They're made
+    on first ask, so a scene can wait on an asset before anything has started making it.
+    """
+
+    def __init__(self):
+        self.futures = {}
+        self.error = None
+        self.lock = threading.Lock()
+
+    def future(self, name: str) -> concurrent.futures.Future:
+        with self.lock:
+            if name not in self.futures:
+                future = concurrent.futures.Future()
+                if self.error is not None:
+                    # Nothing is going to make it any more
+                    future.set_exception(self.error)
+                self.futures[name] = future
+            return self.futures[name]
+
+    def on_ready(self, name: str, callback: Callable[[concurrent.futures.Future], None]):
+        """Call ``callback`` with the asset's future once it's done, straight away if it already is."""
+        self.future(name).add_done_callback(callback)
+
+    def done(self, name: str):
+        return self.future(name).done()
+
+    def put(self, name: str, value):
+        try:
+            self.future(name).set_result(value)
+        except concurrent.futures.InvalidStateError:
+            pass
+
+    def fail(self, error: BaseException):
+        """Fail every asset that hasn't been generated yet, including ones not asked for so far."""
+        with self.lock:
+            self.error = error
+            futures = list(self.futures.values())
+        for future in futures:
+            try:
+                future.set_exception(error)
+            except concurrent.futures.InvalidStateError:
+                pass
+
+    def ready(self, names: Iterable[str]) -> Milestone:
+        """A future that resolves once every named asset is done, or fails with the first that fails."""
+        names = list(names)
+        milestone = Milestone(names)
+
+        def asset_done(name, future):
+            if future.exception() is not None:
+                milestone.fail(future.exception())
+            else:
+                milestone.task_done(name)
+
+        for name in names:
+            self.on_ready(name, lambda future, name=name: asset_done(name, future))
+        return milestone
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+'''
+Headless benchmark of the generation pipeline, from the last setup answer to the
+epilogue.  Chat and diffusion calls go to local stand-ins with configurable latency, so
+the numbers measure how generation is ordered and cached rather than the servers.
+
+Run from src/:  python -m game.benchmark --runs 10 --llm-latency 1.5 --image-latency 8
+'''
+import argparse
+import base64
+import concurrent.futures
+import io
+import random
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+from PIL import Image
+
+from .cache_store import MemoryStore
+from .chatbot import StoryTeller, story_cache
+from .game_types import GameState
+from .generation import start_generation
+from .offline_backend import OfflineBackend
+from .retry_policy import RetryPolicy
+from .scene_plan import GAME_FLOW, scene
+from .stable_diffusion import FINAL_STEPS, ImageGenerator
+from .task_graph import critical_path
+
+# Mirrors the fixed wait in TitleView; the loading screen only waits for the title
+TITLE_TIME = 5.
+
+SETUP_ANSWERS = {
+    'Character Name:': 'Angus McFife',
+    'Character Occupation:': 'Fighter, Protector of Dundee',
+    'Any Additional Info:': 'Angus uses his mighty hammer to protect the land of Fife.',
+}
+
+# Director's scenes as far as generation sees them, without the controllers and their window
+SCENES = [scene(name) for name in GAME_FLOW]
+TITLE, TEXT_DUMP, CUTSCENE, BATTLE, EPILOGUE = (GAME_FLOW.index(name) for name in (
+    'title', 'text dump', 'prologue cutscene', 'battle', 'epilogue cutscene'))
+
+METRICS = ['time_to_title', 'time_to_title_card', 'time_to_cutscene', 'time_to_battle', 'time_to_epilogue', 'time_to_complete']
+
+_blank_png = None
+
+
+def blank_png():
+    global _blank_png
+    if _blank_png is None:
+        buffer = io.BytesIO()
+        Image.new('RGB', (512, 512), (128, 128, 128)).save(buffer, format='PNG')
+        _blank_png = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return _blank_png
+
+
+def gaussian_latency(mean, deviation):
+    if deviation <= 0:
+        return mean
+    return lambda rng: max(0., rng.gauss(mean, deviation))
+
+
+class StandInImageGenerator(ImageGenerator):
+    """
+    ImageGenerator whose diffusion server is simulated in-process.  Each request sleeps
+    for ``latency`` seconds (a number, or a function of a ``random.Random``), scaled
+    for txt2img by the steps and pixels asked for relative to a full-quality image, and
+    returns a blank image, or drops the connection ``failure_rate`` of the time.  Give it
+    its own ``cache_dir`` so the blanks stay out of the real image cache.
+    """
+
+    def __init__(self, cache_dir, latency=0., seed=0, drafts=False, failure_rate=0., retry_policy=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        super().__init__(cache_dir, drafts=drafts, servers=['http://stand-in'], retry_policy=retry_policy)
+
+    def send(self, url:str, path:str, payload:dict=None):
+        if path == '/sdapi/v1/options':
+            return {}
+        if path.startswith('/sdapi/v1/progress'):
+            return {'state': {'job_count': 0}}
+
+        latency = self.latency
+        with self.rng_lock:
+            if callable(latency):
+                latency = latency(self.rng)
+            failed = self.rng.random() < self.failure_rate
+        if path == '/sdapi/v1/txt2img':
+            latency *= payload['steps'] / FINAL_STEPS * payload.get('width', 512) * payload.get('height', 512) / 512 ** 2
+        time.sleep(latency)
+        if failed:
+            raise requests.exceptions.ConnectionError('stand-in server dropped the connection')
+
+        if path == '/rembg':
+            return {'image': payload['input_image']}
+        return {'images': [blank_png()]}
+
+
+def run_once(args, seed, image_cache, retry_policy):
+    state = GameState(
+        story_teller=StoryTeller(use_chatgpt=False,
+                                 backend=OfflineBackend(gaussian_latency(args.llm_latency, args.llm_jitter), seed),
+                                 bundled=not args.unbundled),
+        image_generator=StandInImageGenerator(image_cache, gaussian_latency(args.image_latency, args.image_jitter), seed,
+                                              drafts=args.drafts, failure_rate=args.image_failure_rate,
+                                              retry_policy=retry_policy),
+        window_size=(1200, 900),
+        is_prologue=True,
+        battle_won=False,
+        setup_results=dict(SETUP_ANSWERS))
+    # Same single worker as Director
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    start = time.perf_counter()
+    marks = {}
+
+    def elapsed():
+        return time.perf_counter() - start
+
+    def dwell(minimum=0.):
+        time.sleep((0. if args.skip_scene_minimums else minimum) + args.dwell)
+
+    try:
+        # Generation starts as the loading screen opens
+        start_generation(state, executor, SCENES)
+        plan = state.scene_plan
+        plan.ready(TITLE).result()
+        marks['time_to_title'] = elapsed()
+
+        dwell(TITLE_TIME)
+        plan.ready(TEXT_DUMP).result()
+        dwell()
+        plan.ready(CUTSCENE).result()
+        marks['time_to_cutscene'] = elapsed()
+
+        dwell()
+        plan.ready(BATTLE).result()
+        marks['time_to_battle'] = elapsed()
+
+        dwell()
+        plan.ready(EPILOGUE).result()
+        marks['time_to_epilogue'] = elapsed()
+
+        state.generation_future.result()
+        marks['time_to_complete'] = elapsed()
+        # So a --warm-cache rerun finds every image
+        state.image_generator.flush()
+    finally:
+        executor.shutdown()
+        state.image_generator.close()
+
+    graphs = state.task_graphs
+    timings = {name: timing for graph in graphs for name, timing in graph.timings.items()}
+
+    # The title screen opens on previews; this is when its card is finished
+    marks['time_to_title_card'] = timings['title background'][1] - start
+
+    def path_to_last(names):
+        if not names:
+            return []
+        last = max(names, key=lambda name: timings[name][1])
+        return [(name, begin - start, end - start) for name, begin, end in critical_path(graphs, last)]
+
+    paths = {
+        'time_to_title': path_to_last(plan.waited[TITLE]),
+        'time_to_title_card': path_to_last(['title background']),
+        'time_to_cutscene': path_to_last(plan.waited[CUTSCENE]),
+        'time_to_battle': path_to_last(plan.waited[BATTLE]),
+        'time_to_epilogue': path_to_last(plan.waited[EPILOGUE]),
+        'time_to_complete': path_to_last(list(timings)),
+    }
+    return marks, paths
+
+
+def percentile(values, fraction):
+    # Nearest-rank percentile
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, round(fraction * len(values) + .5) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark time to each scene against stand-in backends.')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--llm-latency', type=float, default=1., help='Mean seconds per chat request.')
+    parser.add_argument('--llm-jitter', type=float, default=.3, help='Standard deviation of chat latency.')
+    parser.add_argument('--image-latency', type=float, default=6., help='Mean seconds per diffusion request.')
+    parser.add_argument('--image-jitter', type=float, default=1., help='Standard deviation of diffusion latency.')
+    parser.add_argument('--image-failure-rate', type=float, default=0.,
+                        help='Share of diffusion requests that fail and have to be retried.')
+    parser.add_argument('--dwell', type=float, default=0., help='Seconds the player spends in each scene.')
+    parser.add_argument('--skip-scene-minimums', action='store_true',
+                        help='Ignore the fixed title screen wait.')
+    parser.add_argument('--warm-cache', action='store_true',
+                        help='Reuse one seed so every run after the first hits the story and image caches.')
+    parser.add_argument('--unbundled', action='store_true', help='Use per-field character requests.')
+    parser.add_argument('--drafts', action='store_true', help='Make draft images first and refine them after.')
+    args = parser.parse_args()
+
+    # Keep benchmark completions out of the on-disk story cache
+    story_cache.store = MemoryStore()
+
+    image_cache = Path(tempfile.mkdtemp(prefix='gamegen_benchmark_'))
+    retry_policy = RetryPolicy()
+
+    results = []
+    try:
+        for run in range(args.runs):
+            seed = args.seed if args.warm_cache else args.seed + run
+            marks, paths = run_once(args, seed, image_cache, retry_policy)
+            results.append((marks, paths))
+            print(f'run {run}: ' + '  '.join(f'{metric} {marks[metric]:.2f}s' for metric in METRICS))
+    finally:
+        shutil.rmtree(image_cache, ignore_errors=True)
+
+    print(f'\n{"metric":<22}{"p50":>10}{"p95":>10}')
+    for metric in METRICS:
+        values = [marks[metric] for marks, _ in results]
+        print(f'{metric:<22}{percentile(values, .5):>9.2f}s{percentile(values, .95):>9.2f}s')
+
+    print(f'\nstory cache: {story_cache.cache_info()}')
+    print(f'image requests: {retry_policy.stats()}')
+
+    # Critical path of the median run for each metric
+    for metric in METRICS:
+        marks, paths = sorted(results, key=lambda result: result[0][metric])[len(results) // 2]
+        print(f'\ncritical path for {metric} ({marks[metric]:.2f}s):')
+        previous_end = None
+        for name, begin, end in paths[metric]:
+            waited = begin - previous_end if previous_end is not None else begin
+            print(f'  {name:<40} waited {waited:6.2f}s  ran {end - begin:6.2f}s  done at {end:6.2f}s')
+            previous_end = end
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import collections
+import pickle
+import sqlite3
+import threading
+import time
+
+MISSING = object()
+
+
+class MemoryStore:
+    """
+    In-process LRU store.  Nothing is persisted, which makes it useful for benchmarks and
+    for sessions that shouldn't touch the on-disk cache.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if self.max_entries is not None:
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SQLiteStore:
+    """
+    Persistent store with one SQLite row per entry.  Lookups go through the primary key
+    index, each write is its own transaction, and WAL mode plus a busy timeout let
+    several threads and processes share the file.  When ``max_entries`` is set the least
+    recently used entries are evicted once the store outgrows it.
+    """
+
+    BUSY_TIMEOUT = 30.
+
+    def __init__(self, path, max_entries=None):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.setup_lock = threading.Lock()
+        self.is_set_up = False
+        self.size = 0
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            with self.setup_lock:
+                if not self.is_set_up:
+                    self.set_up(connection)
+                    self.is_set_up = True
+        return connection
+
+    def set_up(self, connection):
+        connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                           '(key BLOB PRIMARY KEY, value BLOB NOT NULL, last_used REAL NOT NULL)')
+        connection.execute('CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)')
+
+        self.size = connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def get(self, key, default=MISSING):
+        connection = self.connection()
+        row = connection.execute('SELECT value FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return default
+        if self.max_entries is not None:
+            connection.execute('UPDATE entries SET last_used = ? WHERE key = ?', (time.time(), key))
+        return pickle.loads(row[0])
+
+    def put(self, key, value):
+        connection = self.connection()
+        connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?)',
+                           (key, pickle.dumps(value), time.time()))
+        # Replacements overcount, which only brings the next recount forward
+        self.size += 1
+        if self.max_entries is not None and self.size > self.max_entries:
+            self.evict(connection)
+
+    def evict(self, connection):
+        # Other processes write to the same file, so recount before trimming
+        self.size = connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        excess = self.size - self.max_entries
+        if excess > 0:
+            connection.execute('DELETE FROM entries WHERE key IN '
+                               '(SELECT key FROM entries ORDER BY last_used LIMIT ?)', (excess,))
+            self.size -= excess
+
+    def __len__(self):
+        return self.connection().execute('SELECT COUNT(*) FROM entries').fetchone()[0]
@@ -2,21 +2,137 @@
 
 import argparse
 import dotenv
+import functools
+import json
 import os
-import openai
 
+from .llm_backend import OpenAIBackend
+from .offline_backend import OfflineBackend
+from .cache_store import MISSING
+from .combat import DEFAULT_ATTACKS, DEFAULT_ITEMS, parse_actions
+from .task_graph import Task, TaskGraph
 from .utils import persistent_cache
 
 dotenv.load_dotenv()
 
-STORY_CACHE = 'cache.pkl'
+STORY_CACHE = 'cache.sqlite'
+STORY_CACHE_MAX_ENTRIES = 50000
+MAX_PARALLEL_REQUESTS = 4
+# TaskGraph lane of the story steps, limited to MAX_PARALLEL_REQUESTS chat requests at once
+LLM_LANE = 'llm'
+
+PLAYER_FIELDS = ('player_name', 'player_job', 'player_misc')
+# Story fields holding lists of combat.Action rather than text
+ACTION_FIELDS = ('main_character_attacks', 'main_character_inventory', 'final_boss_attacks', 'final_boss_inventory')
+
+
+story_cache = persistent_cache(STORY_CACHE, max_entries=STORY_CACHE_MAX_ENTRIES,
+                               key=lambda story_teller, payload: (story_teller.backend.cache_id,
+                                                                story_teller.MODEL, payload))
+
+
+def story_step(reads, writes, bundle=False):
+    """
+    Declare the story fields a StoryTeller method reads and writes, so that
+    StoryTeller.story_graph can schedule it.
+
+    A step is written as a generator that yields chat payloads and is sent each
+    completion back.  That lets the same body run on the blocking backend through the
+    decorated method, and on an event loop through its ``async_step``.
+
+    A ``bundle`` step writes several fields from one request.  A bundled StoryTeller
+    schedules it in place of the per-field steps for those fields.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def step(self):
+            body = func(self)
+            continue_step(body, self.invoke_chatgpt(next(body)), self.invoke_chatgpt)
+
+        async def async_step(self):
+            body = func(self)
+            payload = next(body)
+            while True:
+                try:
+                    payload = body.send(await self.ainvoke_chatgpt(payload))
+                except StopIteration:
+                    return
+
+        step.reads = tuple(reads)
+        step.writes = tuple(writes)
+        step.bundle = bundle
+        step.body = func
+        step.async_step = async_step
+        return step
+    return decorator
+
+
+def continue_step(body, response, invoke):
+    # Send the completion to the step, then answer any further payloads it yields
+    while True:
+        try:
+            payload = body.send(response)
+        except StopIteration:
+            return
+        response = invoke(payload)
+
+
+ATTACK_FORMATTING = 'Each attack is a JSON object with "name", "damage", "accuracy" and "description" keys.  ' \
+                    'The value for "damage" is a single integer that is positive if it deals damage and ' \
+                    'negative if it heals, "accuracy" is an integer percentage, and "description" is ' \
+                    'five words or less.  '
+ITEM_FORMATTING = 'Each item is a JSON object with "name", "damage" and "description" keys.  The value ' \
+                  'for "damage" is a single integer, negative for healing, and "description" is five ' \
+                  'words or less.  '
+
+
+def parse_bundle(response, validators):
+    """
+    Pull the JSON object out of a bundled completion and validate each of its fields.
+    Returns the fields that passed; anything missing or malformed is left out so the
+    caller can fall back to asking for it on its own.
+    """
+    start, end = response.find('{'), response.rfind('}')
+    if start == -1:
+        return {}
+    try:
+        bundle = json.loads(response[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(bundle, dict):
+        return {}
+
+    fields = {}
+    for key, validate in validators.items():
+        try:
+            fields[key] = validate(bundle[key])
+        except (KeyError, TypeError, ValueError):
+            print(f'Bundled field {key} failed validation')
+    return fields
+
+
+def validate_name(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(value)
+    return value.strip()
+
+
+def validate_phrases(value):
+    if not isinstance(value, list) or not value or not all(isinstance(phrase, str) for phrase in value):
+        raise ValueError(value)
+    return [phrase.strip() for phrase in value]
 
 
 class StoryTeller:
-    def __init__(self, use_chatgpt):
+    def __init__(self, use_chatgpt, backend=None, bundled=False):
         self.use_chatgpt = use_chatgpt
-        if use_chatgpt:
-            openai.api_key = os.getenv('CHAT_GPT_KEY')
+        self.bundled = bundled
+        if backend is None:
+            if use_chatgpt:
+                backend = OpenAIBackend(api_key=os.getenv('CHAT_GPT_KEY'))
+            else:
+                backend = OfflineBackend()
+        self.backend = backend
 
         self.BASE_PROMPT = 'Pretend you are the narrator of a video game.  Your job ' \
                            'is to generate plotlines for the story.'
@@ -29,10 +145,73 @@ class StoryTeller:
                                  'until you generate enough dialogue.'
         self.MODEL = 'gpt-3.5-turbo'
 
-    @persistent_cache(STORY_CACHE)
+        # Every story field exists from the start; story_graph treats None as not generated yet
+        for field in self.story_fields():
+            setattr(self, field, None)
+
+    @story_cache
     def invoke_chatgpt(self, payload):
-        response = openai.ChatCompletion.create(model=self.MODEL, messages=payload)
-        return response.choices[0].message.content
+        return self.backend.complete(self.MODEL, payload)
+
+    @story_cache
+    async def ainvoke_chatgpt(self, payload):
+        return await self.backend.acomplete(self.MODEL, payload)
+
+    def stream_chatgpt(self, payload):
+        """
+        Yield the completion for ``payload`` token by token as it arrives.  A cached
+        completion is yielded in one piece.
+        """
+        cached = story_cache.lookup((self, payload), {})
+        if cached is not MISSING:
+            yield cached
+            return
+
+        tokens = []
+        for token in self.backend.stream(self.MODEL, payload):
+            tokens.append(token)
+            yield token
+        story_cache.remember((self, payload), {}, ''.join(tokens))
+
+    def stream_step(self, step_name, stream):
+        """
+        Run a story step, writing its raw completion into the TextStream ``stream`` as it
+        arrives.  The step's field is set once the completion is finished.
+        """
+        body = getattr(type(self), step_name).body(self)
+        try:
+            for token in self.stream_chatgpt(next(body)):
+                stream.write(token)
+            continue_step(body, stream.text, self.invoke_chatgpt)
+        except Exception as e:
+            stream.fail(e)
+            raise
+        stream.close()
+
+    def ask_for_actions(self, payload, count, with_accuracy):
+        """
+        Part of a step: yield ``payload`` and parse the reply into ``count`` Actions.  A
+        reply that doesn't parse is sent back once with what was wrong with it, and the
+        defaults are used if the second reply doesn't parse either.
+        """
+        response = yield payload
+        try:
+            return parse_actions(response, count, with_accuracy)
+        except ValueError as e:
+            print(f'Invalid combat stats ({e}), asking again')
+            error = e
+
+        formatting = ATTACK_FORMATTING if with_accuracy else ITEM_FORMATTING
+        response = yield payload + [
+            {'role': 'assistant', 'content': response},
+            {'role': 'user', 'content': f'That could not be used: {error}.  Respond with only a JSON list of '
+                                        f'{count} objects.  ' + formatting}
+        ]
+        try:
+            return parse_actions(response, count, with_accuracy)
+        except ValueError as e:
+            print(f'Invalid combat stats ({e}), using defaults')
+            return list(DEFAULT_ATTACKS if with_accuracy else DEFAULT_ITEMS)[:count]
 
     def add_basic_character_info(self, name, occupation, extra_info):
         self.player_name = name
@@ -40,20 +219,73 @@ class StoryTeller:
         self.player_misc = extra_info
         self.EXTRA_CONTEXT = f'This is extra context about the main character {self.player_name}: "{self.player_misc}"'
 
+    @classmethod
+    def story_steps(cls, bundled=False):
+        steps = [step for step in vars(cls).values() if hasattr(step, 'writes')]
+        if not bundled:
+            return [step for step in steps if not step.bundle]
+
+        bundled_fields = {field for step in steps if step.bundle for field in step.writes}
+        return [step for step in steps if step.bundle or not bundled_fields & set(step.writes)]
+
+    @classmethod
+    def story_fields(cls):
+        return [field for step in cls.story_steps() for field in step.writes]
+
+    def story_graph(self, targets=None, extra_tasks=(), asynchronous=False, streams=None):
+        """
+        Build the TaskGraph that generates ``targets`` (every story field by default),
+        plus whatever ``extra_tasks`` need.  Fields that are already set are not
+        generated again.  With ``asynchronous`` the tasks are coroutine functions for
+        TaskGraph.arun, and any ``extra_tasks`` must be as well.
+
+        ``streams`` maps fields to TextStreams that their steps stream into, for blocking
+        graphs.
+        """
+        if streams is None:
+            streams = {}
+
+        tasks = []
+        for step in self.story_steps(self.bundled):
+            stream = next((streams[field] for field in step.writes if field in streams), None)
+            if asynchronous:
+                fn = functools.partial(step.async_step, self)
+            elif stream is not None:
+                fn = functools.partial(self.stream_step, step.__name__, stream)
+            else:
+                fn = getattr(self, step.__name__)
+            tasks.append(Task(step.__name__, fn, step.reads, step.writes, lane=LLM_LANE))
+        available = [field for field in PLAYER_FIELDS + tuple(self.story_fields())
+                     if getattr(self, field, None) is not None]
+
+        if targets is None:
+            targets = self.story_fields()
+        targets = list(targets) + [field for task in extra_tasks for field in task.reads]
+
+        graph = TaskGraph.for_targets(tasks, targets, available)
+        return TaskGraph(list(graph.tasks.values()) + list(extra_tasks), available)
+
+    def generate(self, targets=None, extra_tasks=(), max_workers=MAX_PARALLEL_REQUESTS, streams=None,
+                 on_task_done=None):
+        graph = self.story_graph(targets, extra_tasks, streams=streams)
+        # ``max_workers`` limits the chat requests; extra tasks like images hand their work
+        # to other backends and return a future, so one more worker is enough for them
+        graph.run(max_workers=max_workers + (1 if extra_tasks else 0), on_task_done=on_task_done,
+                  lanes={LLM_LANE: max_workers})
+        return graph
+
     def generate_story(self):
-        self.select_story_genre()
-        self.select_artistic_tone()
-        self.create_prologue()
-        self.create_title()
-        self.create_title_card_prompt()
-        self.create_main_character()
-        self.create_final_boss()
-        self.create_battle_card_prompt()
-        self.create_prologue_dialogue()
-        self.create_endings()
-        self.create_epilogue_dialogue()
-        self.create_story_card_prompts()
+        self.generate()
+
+    async def agenerate(self, targets=None, extra_tasks=(), max_concurrency=MAX_PARALLEL_REQUESTS):
+        graph = self.story_graph(targets, extra_tasks, asynchronous=True)
+        await graph.arun(max_concurrency=max_concurrency)
+        return graph
 
+    async def agenerate_story(self):
+        await self.agenerate()
+
+    @story_step(reads=PLAYER_FIELDS, writes=('genre',))
     def select_story_genre(self):
         payload = [
             {'role': 'user',
@@ -62,9 +294,10 @@ class StoryTeller:
                         f'information {self.player_misc}, what genre of story '
                         f'should be created?  Respond with a list of three single words.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.genre = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace('\n', '')
 
+    @story_step(reads=PLAYER_FIELDS + ('genre', 'tone'), writes=('prologue',))
     def create_prologue(self):
         payload = [
             {'role': 'system', 'content': self.BASE_PROMPT},
@@ -73,17 +306,19 @@ class StoryTeller:
              'content': f'{self.player_name} is a {self.player_job} in a {self.genre} story '
                         f'with a {self.tone} style.  Write a single paragraph prologue for the story.'}
         ]
-        self.prologue = self.invoke_chatgpt(payload)
+        self.prologue = yield payload
 
+    @story_step(reads=('genre',), writes=('tone',))
     def select_artistic_tone(self):
         payload = [
             {'role': 'system', 'content': f'The genre of the story is {self.genre}'},
             {'role': 'user',
              'content': 'Describe the visual artistic style and mood of the above story in 3 or 4 words.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.tone = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace('\n', '')
 
+    @story_step(reads=('prologue', 'player_name', 'final_boss_name'), writes=('prologue_dialogue',))
     def create_prologue_dialogue(self):
         payload = [
             {'role': 'system', 'content': self.prologue},
@@ -91,31 +326,52 @@ class StoryTeller:
                                         f'and {self.final_boss_name} from immediately before they begin to fight.  ' +
                                         self.DIALOG_FORMATTING}
         ]
-        self.prologue_dialogue = self.invoke_chatgpt(payload)
+        self.prologue_dialogue = yield payload
 
     def create_epilogue_dialogue(self):
+        self.create_epilogue_victory_dialogue()
+        self.create_epilogue_defeat_dialogue()
+
+    @story_step(reads=('epilogue_victory', 'player_name', 'final_boss_name'), writes=('epilogue_victory_dialogue',))
+    def create_epilogue_victory_dialogue(self):
         payload = [
             {'role': 'system', 'content': self.epilogue_victory},
             {'role': 'user', 'content': f'Generate six lines of dialogue between {self.player_name} '
                                         f'and {self.final_boss_name}, after {self.player_name} defeats '
                                         f'{self.final_boss_name} in combat.  ' + self.DIALOG_FORMATTING}
         ]
-        self.epilogue_victory_dialogue = self.invoke_chatgpt(payload)
+        self.epilogue_victory_dialogue = yield payload
+
+    @story_step(reads=('epilogue_defeat', 'player_name', 'final_boss_name'), writes=('epilogue_defeat_dialogue',))
+    def create_epilogue_defeat_dialogue(self):
         payload = [
             {'role': 'system', 'content': self.epilogue_defeat},
             {'role': 'user', 'content': f'Generate six lines of dialogue between {self.player_name} '
                                         f'and {self.final_boss_name}, after {self.final_boss_name} defeats'
                                         f' {self.player_name} in combat.  ' + self.DIALOG_FORMATTING}
         ]
-        self.epilogue_defeat_dialogue = self.invoke_chatgpt(payload)
+        self.epilogue_defeat_dialogue = yield payload
 
     def create_main_character(self):
+        self.create_main_character_description()
+        if self.bundled:
+            self.create_main_character_bundle()
+            return
+        self.create_main_character_prompt()
+        self.create_main_character_attacks()
+        self.create_main_character_inventory()
+
+    @story_step(reads=('prologue', 'player_name', 'player_job'), writes=('main_character_description',))
+    def create_main_character_description(self):
         payload = [
             {'role': 'system', 'content': self.prologue},
             {'role': 'user', 'content': f'Describe the appearance of '
                                         f'{self.player_name} the {self.player_job}.'}
         ]
-        self.main_character_description = self.invoke_chatgpt(payload)
+        self.main_character_description = yield payload
+
+    @story_step(reads=('main_character_description', 'player_name', 'player_job'), writes=('main_character_prompt',))
+    def create_main_character_prompt(self):
         payload = [
             {'role': 'system', 'content': self.main_character_description},
             {'role': 'user', 'content': f'Describe the {self.player_job} in five phrases, '
@@ -123,8 +379,11 @@ class StoryTeller:
                                         f'Do not refer to {self.player_name} by name, '
                                         f'only describe {self.player_name}\'s appearance.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.main_character_prompt = ''.join([i for i in temp if not i.isdigit()]).replace('.', '')
+
+    @story_step(reads=('main_character_description', 'player_name'), writes=('main_character_attacks',))
+    def create_main_character_attacks(self):
         payload = [
             {'role': 'system', 'content': self.main_character_description},
             {'role': 'user', 'content': f'Generate a list of four attacks that {self.player_name} uses.  '
@@ -134,7 +393,10 @@ class StoryTeller:
                                         f'positive if it deals damage and negative if it heals. '
                                         f'The value for the "description" key should be five words or less.'}
         ]
-        self.main_character_attacks = self.invoke_chatgpt(payload)
+        self.main_character_attacks = yield from self.ask_for_actions(payload, 4, with_accuracy=True)
+
+    @story_step(reads=('main_character_description', 'player_name'), writes=('main_character_inventory',))
+    def create_main_character_inventory(self):
         payload = [
             {'role': 'system', 'content': self.main_character_description},
             {'role': 'user', 'content': f'Generate a list of two items that {self.player_name} uses.'
@@ -144,9 +406,56 @@ class StoryTeller:
                                         f'healing item should deal negative damage.  The value for the '
                                         f'"description" key should be five words or less.'}
         ]
-        self.main_character_inventory = self.invoke_chatgpt(payload)
+        self.main_character_inventory = yield from self.ask_for_actions(payload, 2, with_accuracy=False)
+
+    @story_step(reads=('main_character_description', 'player_name', 'player_job'),
+                writes=('main_character_prompt', 'main_character_attacks', 'main_character_inventory'),
+                bundle=True)
+    def create_main_character_bundle(self):
+        payload = [
+            {'role': 'system', 'content': self.main_character_description},
+            {'role': 'user', 'content': f'Describe {self.player_name} the {self.player_job} for a video game.  '
+                                        f'Respond with only a JSON object with these keys.  '
+                                        f'"prompt": a list of five phrases, each five words or fewer, that '
+                                        f'describe {self.player_name}\'s appearance without using their name.  '
+                                        f'"attacks": a list of four attacks that {self.player_name} uses.  ' +
+                                        ATTACK_FORMATTING +
+                                        f'"inventory": a list of two items that {self.player_name} uses.  ' +
+                                        ITEM_FORMATTING + 'One item should heal, the other should damage the boss.'}
+        ]
+        fields = parse_bundle((yield payload), {
+            'prompt': validate_phrases,
+            'attacks': lambda value: parse_actions(value, 4, with_accuracy=True),
+            'inventory': lambda value: parse_actions(value, 2, with_accuracy=False),
+        })
+
+        # Only re-ask for what didn't validate
+        if 'prompt' in fields:
+            self.main_character_prompt = '\n'.join(fields['prompt'])
+        else:
+            yield from type(self).create_main_character_prompt.body(self)
+        if 'attacks' in fields:
+            self.main_character_attacks = fields['attacks']
+        else:
+            yield from type(self).create_main_character_attacks.body(self)
+        if 'inventory' in fields:
+            self.main_character_inventory = fields['inventory']
+        else:
+            yield from type(self).create_main_character_inventory.body(self)
 
     def create_final_boss(self):
+        self.create_final_boss_description()
+        if self.bundled:
+            self.create_final_boss_bundle()
+            return
+        self.create_final_boss_name()
+        self.create_final_boss_prompt()
+        self.create_final_boss_attacks()
+        self.create_final_boss_inventory()
+
+    @story_step(reads=('prologue', 'player_name', 'player_job', 'main_character_description'),
+                writes=('final_boss_description',))
+    def create_final_boss_description(self):
         payload = [
             {'role': 'system', 'content': f'The story is "{self.prologue}".  The protagonist of the story is '
                                           f'{self.player_name}, who is {self.main_character_description}.'},
@@ -154,12 +463,18 @@ class StoryTeller:
                                         f'{self.player_name} the {self.player_job} '
                                         f'needs to fight in one paragraph.'}
         ]
-        self.final_boss_description = self.invoke_chatgpt(payload)
+        self.final_boss_description = yield payload
+
+    @story_step(reads=('final_boss_description',), writes=('final_boss_name',))
+    def create_final_boss_name(self):
         payload = [
             {'role': 'system', 'content': self.final_boss_description},
             {'role': 'user', 'content': 'Generate a name for the final boss.'}
         ]
-        self.final_boss_name = self.invoke_chatgpt(payload)
+        self.final_boss_name = yield payload
+
+    @story_step(reads=('final_boss_name', 'final_boss_description', 'player_name'), writes=('final_boss_prompt',))
+    def create_final_boss_prompt(self):
         payload = [
             {'role': 'system', 'content': f'The final boss\'s name is '
                                           f'{self.final_boss_name}.  ' + self.final_boss_description},
@@ -167,8 +482,11 @@ class StoryTeller:
                                         f'each five words or fewer.  ' + self.PROMPT_FORMATTING +
                                         f'Do not refer to {self.player_name}, only describe {self.final_boss_name}.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.final_boss_prompt = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace(')', '')
+
+    @story_step(reads=('final_boss_name', 'final_boss_description'), writes=('final_boss_attacks',))
+    def create_final_boss_attacks(self):
         payload = [
             {'role': 'system', 'content': f'The final boss\'s name is '
                                           f'{self.final_boss_name}.  ' + self.final_boss_description},
@@ -177,7 +495,10 @@ class StoryTeller:
                                         f'has "name", "damage", "accuracy" and "description" keys.'
                                         f'The value for the "description" key should be five words or less.'}
         ]
-        self.final_boss_attacks = self.invoke_chatgpt(payload)
+        self.final_boss_attacks = yield from self.ask_for_actions(payload, 4, with_accuracy=True)
+
+    @story_step(reads=('final_boss_name', 'final_boss_description', 'player_name'), writes=('final_boss_inventory',))
+    def create_final_boss_inventory(self):
         payload = [
             {'role': 'system', 'content': f'The final boss\'s name is '
                                           f'{self.final_boss_name}.  ' + self.final_boss_description},
@@ -188,9 +509,57 @@ class StoryTeller:
                                         f'The healing item should deal negative damage.  The value for the '
                                         f'"description" key should be five words or less.'}
         ]
-        self.final_boss_inventory = self.invoke_chatgpt(payload)
+        self.final_boss_inventory = yield from self.ask_for_actions(payload, 2, with_accuracy=False)
+
+    @story_step(reads=('final_boss_description', 'player_name'),
+                writes=('final_boss_name', 'final_boss_prompt', 'final_boss_attacks', 'final_boss_inventory'),
+                bundle=True)
+    def create_final_boss_bundle(self):
+        payload = [
+            {'role': 'system', 'content': self.final_boss_description},
+            {'role': 'user', 'content': f'This character is the final boss of a video game, fought by '
+                                        f'{self.player_name}.  Respond with only a JSON object with these keys.  '
+                                        f'"name": a name for the final boss.  '
+                                        f'"prompt": a list of five phrases, each five words or fewer, that '
+                                        f'describe the final boss.  Do not refer to {self.player_name}.  '
+                                        f'"attacks": a list of four attacks that the final boss uses.  ' +
+                                        ATTACK_FORMATTING +
+                                        f'"inventory": a list of two items that the final boss uses.  ' +
+                                        ITEM_FORMATTING + f'One item should heal, the other should damage '
+                                                          f'{self.player_name}.'}
+        ]
+        fields = parse_bundle((yield payload), {
+            'name': validate_name,
+            'prompt': validate_phrases,
+            'attacks': lambda value: parse_actions(value, 4, with_accuracy=True),
+            'inventory': lambda value: parse_actions(value, 2, with_accuracy=False),
+        })
+
+        # The per-field prompts mention the boss by name, so settle that first
+        if 'name' in fields:
+            self.final_boss_name = fields['name']
+        else:
+            yield from type(self).create_final_boss_name.body(self)
+        if 'prompt' in fields:
+            self.final_boss_prompt = '\n'.join(fields['prompt'])
+        else:
+            yield from type(self).create_final_boss_prompt.body(self)
+        if 'attacks' in fields:
+            self.final_boss_attacks = fields['attacks']
+        else:
+            yield from type(self).create_final_boss_attacks.body(self)
+        if 'inventory' in fields:
+            self.final_boss_inventory = fields['inventory']
+        else:
+            yield from type(self).create_final_boss_inventory.body(self)
 
     def create_endings(self):
+        self.create_victory_ending()
+        self.create_defeat_ending()
+
+    @story_step(reads=PLAYER_FIELDS + ('prologue', 'final_boss_description', 'genre', 'tone'),
+                writes=('epilogue_victory',))
+    def create_victory_ending(self):
         payload = [
             {'role': 'system',
              'content': self.BASE_PROMPT + ' ' + self.prologue + ' ' + self.final_boss_description},
@@ -199,7 +568,11 @@ class StoryTeller:
                                         f'story with {self.tone} tone, assuming that {self.player_name} is victorious.'
                                         f'Do not make a list of paragraphs.'}
         ]
-        self.epilogue_victory = self.invoke_chatgpt(payload)
+        self.epilogue_victory = yield payload
+
+    @story_step(reads=PLAYER_FIELDS + ('prologue', 'final_boss_description', 'genre', 'tone'),
+                writes=('epilogue_defeat',))
+    def create_defeat_ending(self):
         payload = [
             {'role': 'system',
              'content': self.BASE_PROMPT + ' ' + self.prologue + ' ' + self.final_boss_description},
@@ -208,8 +581,9 @@ class StoryTeller:
                                         f'story with {self.tone} tone, assuming that {self.player_name} loses the fight.'
                                         f'Do not make a list of paragraphs.'}
         ]
-        self.epilogue_defeat = self.invoke_chatgpt(payload)
+        self.epilogue_defeat = yield payload
 
+    @story_step(reads=('title', 'prologue', 'genre', 'tone'), writes=('title_card_prompt',))
     def create_title_card_prompt(self):
         payload = [
             {'role': 'system',
@@ -220,9 +594,11 @@ class StoryTeller:
                                         self.PROMPT_FORMATTING + f'Only describe the image, '
                                                                  f'do not refer to the characters.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.title_card_prompt = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace(')', '')
 
+    @story_step(reads=('prologue', 'main_character_description', 'final_boss_description',
+                       'player_name', 'final_boss_name'), writes=('battle_card_prompt',))
     def create_battle_card_prompt(self):
         payload = [
             {'role': 'system', 'content': self.prologue + ' ' + self.main_character_description + ' ' + self.final_boss_description},
@@ -231,9 +607,10 @@ class StoryTeller:
                                         self.PROMPT_FORMATTING + f' Do not refer to {self.player_name} or '
                                                                  f'{self.final_boss_name}, only describe the background.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.battle_card_prompt = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace(')', '')
 
+    @story_step(reads=('prologue', 'player_name', 'final_boss_name'), writes=('prologue_card_prompt',))
     def create_prologue_card_prompt(self):
         payload = [
             {'role': 'system', 'content': self.prologue},
@@ -242,9 +619,11 @@ class StoryTeller:
                                         f'Do not refer to {self.player_name} or {self.final_boss_name}, '
                                         f'only describe the background.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.prologue_card_prompt = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace(')', '')
 
+    @story_step(reads=('epilogue_victory', 'player_name', 'final_boss_name'),
+                writes=('epilogue_victory_card_prompt',))
     def create_epilogue_victory_card_prompt(self):
         payload = [
             {'role': 'system', 'content': self.epilogue_victory},
@@ -253,9 +632,11 @@ class StoryTeller:
                                         f'Do not refer to {self.player_name} or {self.final_boss_name}, '
                                         f'only describe the background.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.epilogue_victory_card_prompt = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace(')', '')
 
+    @story_step(reads=('epilogue_defeat', 'player_name', 'final_boss_name'),
+                writes=('epilogue_defeat_card_prompt',))
     def create_epilogue_defeat_card_prompt(self):
         payload = [
             {'role': 'system', 'content': self.epilogue_defeat},
@@ -264,15 +645,20 @@ class StoryTeller:
                                         f'Do not refer to {self.player_name} or {self.final_boss_name}, '
                                         f'only describe the background.'}
         ]
-        temp = self.invoke_chatgpt(payload)
+        temp = yield payload
         self.epilogue_defeat_card_prompt = ''.join([i for i in temp if not i.isdigit()]).replace('.', '').replace(')', '')
 
+    # Made without the prologue, so the title screen can open while the prologue is still
+    # streaming in for the scene after it
+    @story_step(reads=PLAYER_FIELDS + ('genre', 'tone'), writes=('title',))
     def create_title(self):
         payload = [
-            {'role': 'system', 'content': self.prologue},
+            {'role': 'system',
+             'content': f'The story is about {self.player_name}, a {self.player_job}, in a {self.genre} '
+                        f'story with a {self.tone} style.'},
             {'role': 'user', 'content': 'Create a title for this story.'}
         ]
-        self.title = self.invoke_chatgpt(payload)
+        self.title = yield payload
 
 def main():
     parser = argparse.ArgumentParser()
@@ -294,13 +680,13 @@ def main():
     print('Prologue Prompt: \n' + storyteller.prologue_card_prompt + '\n')
     print('Main Character Description: \n' + storyteller.main_character_description + '\n')
     print('Main Character Prompt: \n' + storyteller.main_character_prompt + '\n')
-    print('Main Character Attacks: \n' + storyteller.main_character_attacks + '\n')
-    print('Main Character Inventory: \n' + storyteller.main_character_inventory + '\n')
+    print('Main Character Attacks: \n' + '\n'.join(map(str, storyteller.main_character_attacks)) + '\n')
+    print('Main Character Inventory: \n' + '\n'.join(map(str, storyteller.main_character_inventory)) + '\n')
     print('Boss Name: \n' + storyteller.final_boss_name + '\n')
     print('Boss Description: \n' + storyteller.final_boss_description + '\n')
     print('Boss Prompt: \n' + storyteller.final_boss_prompt + '\n')
-    print('Boss Attacks: \n' + storyteller.final_boss_attacks + '\n')
-    print('Boss Inventory: \n' + storyteller.final_boss_inventory + '\n')
+    print('Boss Attacks: \n' + '\n'.join(map(str, storyteller.final_boss_attacks)) + '\n')
+    print('Boss Inventory: \n' + '\n'.join(map(str, storyteller.final_boss_inventory)) + '\n')
     print('Battle Card Prompt: \n' + storyteller.battle_card_prompt + '\n')
     print('Epilogue Victory: \n' + storyteller.epilogue_victory + '\n')
     print('Epilogue Victory Dialogue: \n' + storyteller.epilogue_victory_dialogue + '\n')
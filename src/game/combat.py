@@ -0,0 +1,81 @@
+import dataclasses
+import json
+import re
+
+
+@dataclasses.dataclass(frozen=True)
+class Action:
+    """An attack or item.  ``damage`` is negative for healing; items always hit."""
+    name: str
+    damage: int
+    description: str
+    accuracy: int = 100
+
+    @property
+    def heals(self):
+        return self.damage < 0
+
+    @property
+    def effect_text(self):
+        if self.heals:
+            return f'Heals: {abs(self.damage)}HP'
+        return f'Deals: {self.damage} Damage'
+
+
+# Used when the model still hasn't produced valid stats after being asked again
+DEFAULT_ATTACKS = [
+    Action('Strike', 150, 'A solid, reliable blow', 90),
+    Action('Heavy Blow', 300, 'Slow but devastating', 60),
+    Action('Quick Jab', 100, 'Fast and hard to dodge', 100),
+    Action('Catch Breath', -150, 'Recover some strength', 100),
+]
+DEFAULT_ITEMS = [
+    Action('Healing Potion', -300, 'Restores lost health'),
+    Action('Bomb', 300, 'Explodes on the target'),
+]
+
+
+def to_int(value):
+    """Read an integer from a stat the model may have written as e.g. ``"85%"`` or ``"-120 HP"``."""
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.search(r'-?\d+', str(value))
+    if match is None:
+        raise ValueError(value)
+    return int(match.group())
+
+
+def parse_action(value, with_accuracy):
+    if not isinstance(value, dict):
+        raise ValueError(f'expected a JSON object, got {value!r}')
+    missing = [key for key in ('name', 'damage') + (('accuracy',) if with_accuracy else ()) if key not in value]
+    if missing:
+        raise ValueError(f'missing {", ".join(missing)} in {value!r}')
+
+    name = str(value['name']).strip()
+    if not name:
+        raise ValueError(f'empty name in {value!r}')
+    accuracy = min(100, max(0, to_int(value['accuracy']))) if with_accuracy else 100
+    return Action(name, to_int(value['damage']), str(value.get('description', '')).strip(), accuracy)
+
+
+def parse_actions(value, count, with_accuracy):
+    """
+    Parse ``count`` Actions from a completion, or from a list already decoded from one.
+    Surrounding prose and extra entries are dropped; anything else that doesn't fit
+    raises ValueError with a message that can be shown to the model.
+    """
+    if isinstance(value, str):
+        start, end = value.find('['), value.rfind(']')
+        if start == -1 or end < start:
+            raise ValueError('expected a JSON list')
+        try:
+            value = json.loads(value[start:end + 1])
+        except ValueError as e:
+            raise ValueError(f'invalid JSON: {e}')
+
+    if not isinstance(value, list) or len(value) < count:
+        raise ValueError(f'expected a list of {count} JSON objects')
+    return [parse_action(action, with_accuracy) for action in value[:count]]
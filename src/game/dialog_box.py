@@ -32,6 +32,15 @@ class DialogBox(arcade.Section):
     def set_callback(self, callback):
         self.callback = callback
 
+    def text(self, index):
+        # Entries are plain strings, or TextStreams that may still be growing
+        content = self.content[index]
+        return content if isinstance(content, str) else content.text
+
+    def text_complete(self, index):
+        content = self.content[index]
+        return isinstance(content, str) or content.done
+
     def finished(self):
         return self.index == len(self.content)
 
@@ -46,8 +55,7 @@ class DialogBox(arcade.Section):
             self.close()
             return
 
-        text = self.content[self.index]
-        if self._char_index == len(text):
+        if self.curr_text_done():
             self.index += 1
             self._char_index = 0
 
@@ -55,14 +63,14 @@ class DialogBox(arcade.Section):
         self.is_open = False
 
     def curr_text_done(self):
-        return self._char_index == len(self.content[self.index])
+        return self._char_index == len(self.text(self.index)) and self.text_complete(self.index)
 
     def on_draw(self):
         start_y = self.bottom + self.height - self.padding - self.font_size
         start_x = self.left + self.padding
         if self.index < len(self.content) and self.is_open:
             self.background.draw(self.left, self.bottom, self.width, self.height)
-            text = self.content[self.index]
+            text = self.text(self.index)
 
             if self.char_per_frame < 1:
                 self._char_index = len(text)
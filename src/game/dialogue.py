@@ -0,0 +1,30 @@
+class DialogueParser:
+    """
+    Splits dialogue in ``name: line`` format into lines as it streams in.  ``feed``
+    returns the lines completed by the new text; ``finish`` returns the last line once
+    the dialogue has ended.
+    """
+    def __init__(self):
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        *lines, self.buffer = self.buffer.split('\n')
+        return self.parse(lines)
+
+    def finish(self):
+        lines = [self.buffer]
+        self.buffer = ""
+        return self.parse(lines)
+
+    @staticmethod
+    def parse(lines):
+        parsed = []
+        for line in lines:
+            line = line.strip()
+            if line.find(': ') == -1:
+                continue
+
+            character, text = line.split(': ', 1)
+            parsed.append((character, line))
+        return parsed
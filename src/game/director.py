@@ -1,5 +1,6 @@
 import arcade
 import concurrent.futures
+import os
 from pathlib import Path
 
 from .scenes.battle import BattleController
@@ -12,9 +13,27 @@ from .game_types import GameState
 from .chatbot import StoryTeller
 from .stable_diffusion import ImageGenerator
 from .audio_player import AudioManager
+from .generation import start_generation
+from .scene_plan import GAME_FLOW, scene
+from .warm_pool import WarmPool
 
 MUSIC_DIR = Path(__file__).parent / 'music'
 MUSIC_VOL = 0.5
+# Directory of pre-generated games filled by `python -m game.warm_pool`, if any
+WARM_POOL_DIR = os.getenv('GAMEGEN_WARM_POOL')
+
+# How each scene in GAME_FLOW is shown: its controller, the music it starts, and the
+# controller's options
+SCENE_CONTROLLERS = {
+    'setup': (SetupController,),
+    'loading': (LoadingController,),
+    'title': (TitleController, 'intro'),
+    'text dump': (TextDumpController,),
+    'prologue cutscene': (CutsceneController,),
+    'battle': (BattleController, 'battle'),
+    'epilogue cutscene': (CutsceneController, 'ending', {'epilogue': True}),
+    'ending': (TitleController, None, {'ending': True}),
+}
 
 class Director:
     state: GameState
@@ -24,164 +43,74 @@ class Director:
         self.window = window
 
         self.state = GameState(
-            story_teller=StoryTeller(use_chatgpt=True),
+            story_teller=StoryTeller(use_chatgpt=True, bundled=True),
             window_size=window.size,
             is_prologue=True,
             battle_won=False,
-            image_generator=ImageGenerator(),
+            image_generator=ImageGenerator(live_previews=True, drafts=True),
             audio_manager=AudioManager(music_dir=MUSIC_DIR))
 
-        game_flow = [
-            SetupController,
-            LoadingController,
-            TitleController,
-            TextDumpController,
-            CutsceneController,
-            BattleController,
-            CutsceneController,
-            TitleController
-        ]
-
-        self.num_stages = len(game_flow)
-        self.scene_iter = iter(game_flow)
+        self.scenes = [scene(name, *SCENE_CONTROLLERS[name]) for name in GAME_FLOW]
+
         self.current_scene = None
-        self.stage_count = 0
+        self.scene_index = -1
+        # Drives the ScenePlan; the chat requests and images it runs have lanes of their own
         self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.warm_pool = WarmPool(WARM_POOL_DIR) if WARM_POOL_DIR else None
+
+    def play_music(self, music):
+        audio_manager = self.state.audio_manager
+        if music == 'intro':
+            music_file = audio_manager.get_intro_music()
+        elif music == 'battle':
+            music_file = audio_manager.get_battle_music()
+        elif self.state.battle_won:
+            music_file = audio_manager.get_victory_music()
+        else:
+            music_file = audio_manager.get_defeat_music()
+
+        if self.state.audio_player is not None:
+            arcade.stop_sound(self.state.audio_player)
+        audio = arcade.load_sound(str(music_file), True)
+        self.state.audio_player = arcade.play_sound(audio, MUSIC_VOL, looping=True)
 
     def advance_game_flow(self):
 
-        self.stage_count += 1
-        if self.stage_count == 3:
-            # Use the results from the first scene to set up the story teller
-
-            print("Generating story.....")
-            # Should be retrieved from the SetupController
-            name, occupation, more_info = self.state.setup_results.values()
-            self.state.story_teller.add_basic_character_info(name, occupation, more_info)
-
-            # Generate story
-
-            print("select_story_genre")
-            self.state.story_teller.select_story_genre()
-            print("select_artistic_tone")
-            self.state.story_teller.select_artistic_tone()
-            print("create_prologue")
-            self.state.story_teller.create_prologue()
-            print("create_title")
-            self.state.story_teller.create_title()
-
-            self.state.story_teller.create_title_card_prompt()
-
-            print('create_background title card')
-            title_prompt = self.state.story_teller.title_card_prompt
-            self.state.image_generator.create_background('title-card', title_prompt)
-
-            def content_in_the_background():
-                print("create_main_character")
-                self.state.story_teller.create_main_character()
-                print("create_final_boss")
-                self.state.story_teller.create_final_boss()
-                print("create_prologue_dialogue")
-                self.state.story_teller.create_prologue_dialogue()
-
-
-                print('create_character hero')
-                character_prompt = self.state.story_teller.main_character_prompt
-                self.state.image_generator.create_character(name, character_prompt, no_bg=True, look_right=True)
-
-                print('create_character boss')
-                character_prompt = self.state.story_teller.final_boss_prompt
-                self.state.image_generator.create_character(self.state.story_teller.final_boss_name, character_prompt, no_bg=True)
-
-                print('create_background prologue')
-                self.state.story_teller.create_prologue_card_prompt()
-                prologue_prompt = self.state.story_teller.prologue_card_prompt
-                self.state.image_generator.create_background('prologue', prologue_prompt)
-
-                self.state.story_teller.create_battle_card_prompt()
-                print('create_background battle')
-                background_prompt = self.state.story_teller.battle_card_prompt
-                self.state.image_generator.create_background('battle', background_prompt)
-
-                # TODO: move to end content
-
-
-            self.state.story_generation_future = self.executor.submit(content_in_the_background)
-
-
-            def final_content_in_background():
-
-                print("create_endings")
-                self.state.story_teller.create_endings()
-                print("create_epilogue_dialogue")
-                self.state.story_teller.create_epilogue_dialogue()
-
-                print('create_background epilogue-victory')
-                self.state.story_teller.create_epilogue_victory_card_prompt()
-                epilogue_victory_prompt = self.state.story_teller.epilogue_victory_card_prompt
-                self.state.image_generator.create_background('epilogue-victory', epilogue_victory_prompt)
-
-                print('create_background epilogue-defeat')
-                self.state.story_teller.create_epilogue_defeat_card_prompt()
-                epilogue_defeat_prompt = self.state.story_teller.epilogue_defeat_card_prompt
-                self.state.image_generator.create_background('epilogue-defeat', epilogue_defeat_prompt)
-
-
-            self.state.ending_content_future = self.executor.submit(final_content_in_background)
-
-        if self.stage_count == 3:
-            # play intro music
-            music_file = self.state.audio_manager.get_intro_music()
-            audio = arcade.load_sound(str(music_file),True)
-            self.state.audio_player = arcade.play_sound(audio, MUSIC_VOL, looping=True)
-        elif self.stage_count == 6:
-            # play battle music
-            arcade.stop_sound(self.state.audio_player)
-
-            music_file = self.state.audio_manager.get_battle_music()
-            audio = arcade.load_sound(str(music_file),True)
-            self.state.audio_player = arcade.play_sound(audio,MUSIC_VOL, looping=True)
-        elif self.stage_count == 7:
-            if self.state.battle_won:
-                # play victory music
-                arcade.stop_sound(self.state.audio_player)
-
-                music_file = self.state.audio_manager.get_victory_music()
-                audio = arcade.load_sound(str(music_file),True)
-                self.state.audio_player = arcade.play_sound(audio,MUSIC_VOL, looping=True)
-            else:
-                # play defeat music
-                arcade.stop_sound(self.state.audio_player)
-
-                music_file = self.state.audio_manager.get_defeat_music()
-                audio = arcade.load_sound(str(music_file),True)
-                self.state.audio_player = arcade.play_sound(audio,MUSIC_VOL, looping=True)
-
-        if self.stage_count > 5:
-            # Wait for the story and images to generate
-            self.state.story_generation_future.result()
-
-        if self.stage_count > 6:
-            # Wait for the final content to generate
-            self.state.ending_content_future.result()
-
-        kwargs = {}
-
-        if self.num_stages == self.stage_count:
-            kwargs = {'ending':True}
-
-        callback = self.advance_game_flow
-
-        try:
-            args = (self.state, callback)
-            self.current_scene = next(self.scene_iter)(*args, **kwargs)
-            self.window.clear()
-            self.window.show_view(self.current_scene.view)
-        except StopIteration:
+        self.scene_index += 1
+        if self.scene_index == len(self.scenes):
             print("Game Over!")
             self.window.close()
             arcade.exit()
+            return
 
+        if self.state.scene_plan is None and self.state.setup_results:
+            # Use the results from the setup to generate the story behind the loading screen
+            print("Generating story.....")
+            start_generation(self.state, self.executor, self.scenes, warm_pool=self.warm_pool)
+
+        if not self.state.scene_ready(self.scene_index):
+            # Nothing here may block the window, so what the scene can't start without is
+            # waited for on a loading screen, which shows the scene when it's ready
+            self.show(LoadingController(self.state, self.show_scene))
+        else:
+            self.show_scene()
+
+    def show_scene(self):
+        if self.state.scene_plan is not None:
+            # Already done; raises if generating what the scene needs failed
+            self.state.scene_plan.ready(self.scene_index).result()
+
+        scene = self.scenes[self.scene_index]
+        self.state.scene_index = self.scene_index
+        if scene.music is not None:
+            self.play_music(scene.music)
+
+        self.show(scene.controller(self.state, self.advance_game_flow, **scene.kwargs))
+
+    def show(self, controller):
+        self.current_scene = controller
+        self.window.clear()
+        self.window.show_view(controller.view)
 
     def start_game(self):
         self.advance_game_flow()
@@ -1,3 +1,5 @@
+import itertools
+
 import arcade
 
 class Drawable():
@@ -12,3 +14,76 @@ class Drawable():
             arcade.draw_texture_rectangle(left + width // 2, bottom + height // 2, width, height, self.texture)
         else:
             raise ValueError('Either color or texture must be specified')
+
+
+texture_ids = itertools.count()
+
+
+def stream_texture(image):
+    # Textures have to be made on the arcade thread, so they're made at draw time.  They
+    # aren't collided with, so skip working out a hit box.  The atlas goes by name, so
+    # each gets a new one; a reused name would bring back whatever picture had it before.
+    return arcade.Texture(f'stream-{next(texture_ids)}', image, hit_box_algorithm='None')
+
+
+def release_texture(texture):
+    """
+    Drop a stream texture a newer version has replaced from the texture atlas, which
+    otherwise keeps every preview and draft for the rest of the game.
+    """
+    if texture is None:
+        return
+    atlas = arcade.get_window().ctx.default_atlas
+    if atlas.has_texture(texture):
+        atlas.remove(texture)
+
+
+class LiveDrawable(Drawable):
+    """
+    Draws an ImageStream: ``color`` until there is a picture, then the latest preview or
+    draft, swapping in the final image once it lands.
+    """
+    def __init__(self, stream, color=arcade.color.BLACK):
+        super().__init__(color=color)
+        self.stream = stream
+        self.version = 0
+
+    def draw(self, left, bottom, width, height):
+        if self.stream.version != self.version:
+            self.refresh()
+        super().draw(left, bottom, width, height)
+
+    def refresh(self):
+        version, image = self.stream.snapshot()
+        if image is not None:
+            replaced, self.texture = self.texture, stream_texture(image)
+            release_texture(replaced)
+            self.color = None
+        self.version = version
+
+
+class LiveSprite(arcade.Sprite):
+    """
+    A sprite showing an ImageStream, like LiveDrawable; it isn't drawn until there is a
+    picture.  It keeps the size of the first picture, so it doesn't jump when a smaller
+    draft is swapped for the final image.
+    """
+    def __init__(self, stream, scale=1.):
+        super().__init__(scale=scale)
+        self.stream = stream
+        self.version = 0
+        self.size = None
+
+    def draw(self, **kwargs):
+        if self.stream.version != self.version:
+            version, image = self.stream.snapshot()
+            if image is not None:
+                replaced, self.texture = self.texture, stream_texture(image)
+                release_texture(replaced)
+                if self.size is None:
+                    self.size = self.width, self.height
+                else:
+                    self.width, self.height = self.size
+            self.version = version
+        if self.texture is not None:
+            super().draw(**kwargs)
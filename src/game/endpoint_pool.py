@@ -0,0 +1,161 @@
+import threading
+from typing import Callable, List
+
+import requests
+
+from .retry_policy import CircuitOpenError, RetryPolicy
+
+# Seconds between health and queue-depth probes of each server
+PROBE_INTERVAL = 10.
+# EndpointPool.choose's answer when every server it could use is at max_in_flight
+FULL = object()
+
+
+class Endpoint:
+    def __init__(self, url: str, breaker):
+        self.url = url
+        self.healthy = True
+        self.breaker = breaker
+        # Jobs this process has running there, and the server's own queue at the last probe
+        self.in_flight = 0
+        self.queued = 0
+
+    @property
+    def load(self):
+        # The server's queue includes our jobs too, once it has seen them
+        return max(self.in_flight, self.queued)
+
+
+class EndpointPool:
+    """
+    Diffusion servers to spread jobs over.  ``run`` sends a job to the least loaded
+    healthy server and retries it under ``policy``, moving it on to another server first
+    if there is one.  A server never runs more than ``max_in_flight`` of this process's
+    jobs; once the healthy ones are all that busy, jobs wait for a slot.  With more than
+    one server, ``probe(url)`` is called every ``interval`` seconds on a background
+    thread to check each one is up and read how many jobs it has queued.
+    """
+
+    def __init__(self, urls: List[str], probe: Callable[[str], int], policy: RetryPolicy = None,
+                 interval: float = PROBE_INTERVAL, max_in_flight: int | None = None):
+        if not urls:
+            raise ValueError('need at least one diffusion server')
+        self.policy = RetryPolicy() if policy is None else policy
+        self.endpoints = [Endpoint(url.rstrip('/'), self.policy.breaker(fallback=len(urls) > 1)) for url in urls]
+        self.probe = probe
+        self.interval = interval
+        self.max_in_flight = max_in_flight
+        self.lock = threading.Lock()
+        self.slot_freed = threading.Condition(self.lock)
+        self.stopping = threading.Event()
+        self.prober = None
+        if len(self.endpoints) > 1:
+            self.prober = threading.Thread(target=self.probe_all, daemon=True)
+            self.prober.start()
+
+    @property
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def probe_all(self):
+        while True:
+            for endpoint in self.endpoints:
+                try:
+                    queued = self.probe(endpoint.url)
+                except Exception as e:
+                    if endpoint.healthy:
+                        print(f'Diffusion server {endpoint.url} is down: {e}')
+                    endpoint.healthy = False
+                    continue
+                if not endpoint.healthy:
+                    print(f'Diffusion server {endpoint.url} is back')
+                endpoint.healthy = True
+                endpoint.queued = queued
+            if self.stopping.wait(self.interval):
+                return
+
+    def stop(self):
+        self.stopping.set()
+
+    def choose(self, avoid=()):
+        """
+        The least loaded healthy server whose circuit breaker is closed and that has fewer
+        than ``max_in_flight`` of our jobs, preferring ones not in ``avoid``.  Returns None
+        if every breaker is open, or FULL if the servers to use are all at the limit.
+        """
+        candidates = [endpoint for endpoint in self.endpoints if endpoint.breaker.available()]
+        if not candidates:
+            return None
+        # If every server looks down, try them anyway; the probes may be behind
+        candidates = [endpoint for endpoint in candidates if endpoint.healthy] or candidates
+        if self.max_in_flight is not None:
+            candidates = [endpoint for endpoint in candidates if endpoint.in_flight < self.max_in_flight]
+            if not candidates:
+                return FULL
+        candidates = [endpoint for endpoint in candidates if endpoint not in avoid] or candidates
+        return min(candidates, key=lambda endpoint: endpoint.load)
+
+    def claim(self, avoid=()):
+        """choose() a server and count the job as in flight there, waiting for a free slot if need be."""
+        with self.slot_freed:
+            endpoint = self.choose(avoid)
+            while endpoint is FULL:
+                self.slot_freed.wait()
+                endpoint = self.choose(avoid)
+            if endpoint is not None:
+                endpoint.breaker.sending()
+                endpoint.in_flight += 1
+            return endpoint
+
+    def run(self, job: Callable[[str], object]):
+        """
+        Call ``job`` with the URL of the least loaded server.  Failures the policy says are
+        worth retrying move the job to a server it hasn't tried yet, or once it's tried
+        them all, back off and go round again.
+        """
+        policy = self.policy
+        tried = []
+        error = None
+        for attempt in range(policy.attempts):
+            endpoint = self.claim(avoid=tried)
+            if endpoint is None:
+                policy.count('circuit_open')
+                raise CircuitOpenError('every diffusion server is failing') from error
+            if endpoint in tried:
+                policy.count('retries')
+                # Keeps its slot while it waits, so the server never has more than its share
+                policy.backoff(attempt)
+            elif tried:
+                policy.count('failovers')
+
+            policy.count('attempts')
+            try:
+                result = job(endpoint.url)
+            except requests.exceptions.RequestException as e:
+                if not policy.should_retry(e):
+                    # The server answered; it just turned the request down
+                    endpoint.breaker.succeeded()
+                    raise
+                error = e
+                policy.count('failures')
+                if isinstance(e, requests.exceptions.Timeout):
+                    policy.count('timeouts')
+                elif isinstance(e, requests.exceptions.ConnectionError):
+                    endpoint.healthy = False
+                endpoint.breaker.failed()
+                if endpoint not in tried:
+                    tried.append(endpoint)
+                print(f'Diffusion request to {endpoint.url} failed (attempt {attempt + 1} of {policy.attempts}): {e}')
+                continue
+            except BaseException:
+                endpoint.breaker.abandoned()
+                raise
+            finally:
+                with self.slot_freed:
+                    endpoint.in_flight -= 1
+                    self.slot_freed.notify()
+            endpoint.breaker.succeeded()
+            return result
+
+        policy.count('gave_up')
+        raise error
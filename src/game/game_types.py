@@ -1,10 +1,18 @@
 import dataclasses
 from concurrent.futures import Future
+from typing import TYPE_CHECKING
 
 from .chatbot import StoryTeller
 from .stable_diffusion import ImageGenerator
+from .asset_store import AssetStore
 from .audio_player import AudioManager
-from pyglet.media import Player
+from .scene_plan import ScenePlan
+from .task_graph import TaskGraph
+from .text_stream import TextStream
+
+if TYPE_CHECKING:
+    # Only for the annotation, so the headless benchmark can use GameState without pyglet
+    from pyglet.media import Player
 
 @dataclasses.dataclass
 class GameState:
@@ -13,8 +21,27 @@ class GameState:
     window_size: tuple[int, int]
     is_prologue: bool
     battle_won: bool
-    story_generation_future: Future | None = None
-    ending_content_future: Future | None = None
+    # Each story field and image, as it's generated
+    assets: AssetStore = dataclasses.field(default_factory=AssetStore)
+    # What the scenes need, generating in the background once the setup is done
+    scene_plan: ScenePlan | None = None
+    generation_future: Future | None = None
+    # Index of the scene being shown, in the Director's scene list
+    scene_index: int = 0
+    # Story fields that are streamed while they generate, keyed by field name
+    text_streams: dict[str, TextStream] = dataclasses.field(default_factory=dict)
+    # Every TaskGraph run for this game, with per-task timings
+    task_graphs: list[TaskGraph] = dataclasses.field(default_factory=list)
     setup_results: dict[str, str] = dataclasses.field(default_factory=dict)
     audio_manager:AudioManager = None
-    audio_player:Player = None
+    audio_player:'Player' = None
+
+    def scene_ready(self, index: int):
+        """
+        Whether scene ``index`` has everything it waits on, or generation failed getting
+        it.  Scenes before generation starts wait on nothing.
+        """
+        return self.scene_plan is None or self.scene_plan.ready(index).done()
+
+    def next_scene_ready(self):
+        return self.scene_ready(self.scene_index + 1)
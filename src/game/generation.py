@@ -0,0 +1,122 @@
+from .chatbot import LLM_LANE, MAX_PARALLEL_REQUESTS
+from .game_types import GameState
+from .scene_plan import ScenePlan, image_deadlines
+from .task_graph import Task
+from .text_stream import TextStream
+
+# Fields that are written with the player's name in them, so pre-generated stories leave them out
+PERSONAL_FIELDS = ('prologue_dialogue', 'epilogue_victory_dialogue', 'epilogue_defeat_dialogue')
+
+# TaskGraph lane of the image tasks.  They only queue their image on the generator's
+# scheduler, which limits the jobs each diffusion server runs and orders them, so the
+# lane isn't limited.
+IMAGE_LANE = 'images'
+
+
+# Deadlines for scheduling each image when there's no ScenePlan to take them from, in
+# the order the game shows them
+DEFAULT_DEADLINES = {
+    'title background': 0,
+    'hero portrait': 1,
+    'boss portrait': 1,
+    'prologue background': 1,
+    'battle background': 2,
+    'epilogue-victory background': 3,
+    'epilogue-defeat background': 3,
+}
+
+
+def image_tasks(story_teller, image_generator, deadlines=DEFAULT_DEADLINES):
+    """
+    Tasks that generate each of the game's images, keyed by task name.  Each reads the
+    story fields its prompt is made from, then queues the image on the generator's
+    scheduler, which orders the images by ``deadlines``, e.g. the index of the first
+    scene that shows each one, and returns the future for it.
+    """
+    tasks = [
+        Task('title background',
+             lambda: image_generator.submit_background(
+                 'title-card', story_teller.title_card_prompt, deadline=deadlines.get('title background')),
+             reads=('title_card_prompt',), lane=IMAGE_LANE),
+        Task('hero portrait',
+             lambda: image_generator.submit_character(
+                 story_teller.player_name, story_teller.main_character_prompt, no_bg=True, look_right=True,
+                 deadline=deadlines.get('hero portrait')),
+             reads=('player_name', 'main_character_prompt'), lane=IMAGE_LANE),
+        Task('boss portrait',
+             lambda: image_generator.submit_character(
+                 story_teller.final_boss_name, story_teller.final_boss_prompt, no_bg=True,
+                 deadline=deadlines.get('boss portrait')),
+             reads=('final_boss_name', 'final_boss_prompt'), lane=IMAGE_LANE),
+        Task('prologue background',
+             lambda: image_generator.submit_background(
+                 'prologue', story_teller.prologue_card_prompt, deadline=deadlines.get('prologue background')),
+             reads=('prologue_card_prompt',), lane=IMAGE_LANE),
+        Task('battle background',
+             lambda: image_generator.submit_background(
+                 'battle', story_teller.battle_card_prompt, deadline=deadlines.get('battle background')),
+             reads=('battle_card_prompt',), lane=IMAGE_LANE),
+        Task('epilogue-victory background',
+             lambda: image_generator.submit_background(
+                 'epilogue-victory', story_teller.epilogue_victory_card_prompt, deadline=deadlines.get('epilogue-victory background')),
+             reads=('epilogue_victory_card_prompt',), lane=IMAGE_LANE),
+        Task('epilogue-defeat background',
+             lambda: image_generator.submit_background(
+                 'epilogue-defeat', story_teller.epilogue_defeat_card_prompt, deadline=deadlines.get('epilogue-defeat background')),
+             reads=('epilogue_defeat_card_prompt',), lane=IMAGE_LANE),
+    ]
+    return {task.name: task for task in tasks}
+
+
+def start_generation(state: GameState, executor, scenes, warm_pool=None):
+    """
+    Start generating everything ``scenes`` need once the setup answers are in.  It runs
+    on ``executor`` as a ScenePlan, which works through the scenes' needs in playthrough
+    order.  The plan is stored on ``state`` straight away, so the Director and scenes can
+    check what's ready without waiting on anything.  Nothing here needs a window, so it
+    can also be driven headless.
+
+    With a ``warm_pool``, a pre-generated game matching the player's genre and tone is
+    used if there is one, and only its dialogue is generated.
+    """
+    # Should be retrieved from the SetupController
+    name, occupation, more_info = state.setup_results.values()
+    state.story_teller.add_basic_character_info(name, occupation, more_info)
+
+    plan = ScenePlan(scenes, assets=state.assets, streams=state.text_streams)
+    state.scene_plan = plan
+
+    def generate():
+        try:
+            build(state, plan, warm_pool)
+        except Exception as e:
+            plan.fail(e)
+            raise
+        # Image tasks only hold a worker while they queue their image, so one worker
+        # beside the chat requests' keeps a story step from waiting on them
+        print("generating story")
+        plan.run(MAX_PARALLEL_REQUESTS + 1, {LLM_LANE: MAX_PARALLEL_REQUESTS})
+
+    state.generation_future = executor.submit(generate)
+
+
+def build(state: GameState, plan: ScenePlan, warm_pool=None):
+    story_teller = state.story_teller
+    image_generator = state.image_generator
+
+    if warm_pool is not None:
+        state.task_graphs.append(story_teller.generate(targets=['genre', 'tone']))
+        if warm_pool.take(story_teller, image_generator):
+            print('using a pre-generated story')
+
+    # Text the scenes can start showing before its step has finished.  The first scene to
+    # read one comes after the title screen, which waits on the plan, so they're in place
+    # in time.
+    streams = state.text_streams
+    for scene in plan.scenes:
+        for field in scene.needs.streamed:
+            if getattr(story_teller, field) is None:
+                streams[field] = TextStream()
+
+    images = image_tasks(story_teller, image_generator, image_deadlines(plan.scenes))
+    state.task_graphs.append(plan.build(story_teller, images))
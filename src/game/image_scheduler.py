@@ -0,0 +1,62 @@
+import concurrent.futures
+import heapq
+import itertools
+import math
+import threading
+from typing import Callable
+
+
+class ImageScheduler:
+    """
+    Runs image jobs at most ``max_parallel`` at a time, with one future per asset name.
+    Queued jobs start earliest ``deadline`` first (e.g. the index of the scene that needs
+    the image), then highest ``priority``, then in the order they were submitted.
+
+    Worker threads are started as jobs come in and exit when the queue is empty, so an
+    idle scheduler holds no threads.
+    """
+
+    def __init__(self, max_parallel: int = 2):
+        self.max_parallel = max_parallel
+        self.queue = []
+        self.futures: dict[str, concurrent.futures.Future] = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.workers = 0
+
+    def submit(self, name: str, fn: Callable, priority: int = 0, deadline: float | None = None):
+        """
+        Queue ``fn`` to produce asset ``name`` and return the future for its result.  An
+        asset that was already submitted isn't queued again; its existing future is
+        returned.
+        """
+        with self.lock:
+            if name in self.futures:
+                return self.futures[name]
+            future = concurrent.futures.Future()
+            self.futures[name] = future
+            order = (math.inf if deadline is None else deadline, -priority, next(self.counter))
+            heapq.heappush(self.queue, (order, fn, future))
+
+            if self.workers < self.max_parallel:
+                self.workers += 1
+                threading.Thread(target=self.work, daemon=True).start()
+        return future
+
+    def future(self, name: str):
+        return self.futures.get(name)
+
+    def work(self):
+        while True:
+            with self.lock:
+                if not self.queue:
+                    self.workers -= 1
+                    return
+                _, fn, future = heapq.heappop(self.queue)
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
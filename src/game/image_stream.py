@@ -0,0 +1,60 @@
+import threading
+
+
+class ImageStream:
+    """
+    An image that is still generating.  The generator writes preview images as the
+    diffusion server publishes them, may publish a usable ``draft``, then closes the
+    stream with the final image.  Readers (e.g. a LiveDrawable on the arcade thread)
+    compare ``version`` to see when to pick up a newer picture.
+
+    Previews and drafts are scaled to ``size``, if given, so readers see the picture at
+    the final image's size throughout.  Once there's a draft, previews are ignored: the
+    early steps of its refinement would look worse than the draft does.
+    """
+
+    def __init__(self, size=None):
+        self.image = None
+        self.version = 0
+        self.done = False
+        self.drafted = False
+        self.error = None
+        self.size = size
+        self.lock = threading.Lock()
+
+    def fit(self, image):
+        if self.size is not None and image.size != tuple(self.size):
+            return image.resize(self.size)
+        return image
+
+    def write(self, image):
+        image = self.fit(image)
+        with self.lock:
+            if not self.done and not self.drafted:
+                self.image = image
+                self.version += 1
+
+    def draft(self, image):
+        image = self.fit(image)
+        with self.lock:
+            if not self.done:
+                self.image = image
+                self.drafted = True
+                self.version += 1
+
+    def close(self, image):
+        with self.lock:
+            self.image = image
+            self.done = True
+            self.version += 1
+
+    def fail(self, error):
+        with self.lock:
+            self.error = error
+            self.done = True
+            self.version += 1
+
+    def snapshot(self):
+        """The current ``(version, image)``, read together."""
+        with self.lock:
+            return self.version, self.image
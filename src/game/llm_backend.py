@@ -0,0 +1,83 @@
+import asyncio
+
+import aiohttp
+import openai
+
+MAX_IN_FLIGHT = 16
+KEEPALIVE_TIMEOUT = 60
+
+
+class OpenAIBackend:
+    """
+    Chat completion backend shared by any number of StoryTellers.
+
+    The blocking ``complete`` is what the threaded code paths use.  ``acomplete`` runs on
+    an event loop through a keep-alive aiohttp session for that loop, with at most
+    ``max_in_flight`` requests outstanding at once, so a single loop can drive many story
+    generations.  Each loop's session is closed by ``aclose``, or by asyncio.run as the
+    loop shuts down.
+    """
+
+    cache_id = 'openai'
+
+    def __init__(self, api_key=None, max_in_flight=MAX_IN_FLIGHT):
+        if api_key is not None:
+            openai.api_key = api_key
+
+        self.max_in_flight = max_in_flight
+        # Event loop -> (the async generator holding its session open, (session, semaphore))
+        self.sessions = {}
+
+    def complete(self, model, payload):
+        response = openai.ChatCompletion.create(model=model, messages=payload)
+        return response.choices[0].message.content
+
+    def stream(self, model, payload):
+        for chunk in openai.ChatCompletion.create(model=model, messages=payload, stream=True):
+            token = chunk.choices[0].delta.get('content')
+            if token:
+                yield token
+
+    async def acomplete(self, model, payload):
+        session, semaphore = await self.bind_loop()
+        async with semaphore:
+            token = openai.aiosession.set(session)
+            try:
+                response = await openai.ChatCompletion.acreate(model=model, messages=payload)
+            finally:
+                openai.aiosession.reset(token)
+        return response.choices[0].message.content
+
+    async def bind_loop(self):
+        # A session and semaphore only work on the loop they were made on, so each loop
+        # gets its own
+        loop = asyncio.get_running_loop()
+        if loop not in self.sessions:
+            owner = self.own_session(loop)
+            self.sessions[loop] = owner, await owner.__anext__()
+        return self.sessions[loop][1]
+
+    async def own_session(self, loop):
+        # Held open by an async generator so that asyncio.run, through the loop's
+        # shutdown_asyncgens, closes the session before it closes the loop
+        connector = aiohttp.TCPConnector(limit=self.max_in_flight, keepalive_timeout=KEEPALIVE_TIMEOUT)
+        session = aiohttp.ClientSession(connector=connector)
+        try:
+            yield session, asyncio.Semaphore(self.max_in_flight)
+        finally:
+            await session.close()
+            if self.sessions.get(loop, (None, (None, None)))[1][0] is session:
+                del self.sessions[loop]
+
+    async def aclose(self):
+        """Close the running loop's session."""
+        owner = self.sessions.get(asyncio.get_running_loop())
+        if owner is not None:
+            await owner[0].aclose()
+
+    async def __aenter__(self):
+        await self.bind_loop()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
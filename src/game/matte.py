@@ -0,0 +1,72 @@
+import numpy as np
+from PIL import Image
+
+# How far, in any channel, a pixel can be from the backdrop colour and still be backdrop
+BACKDROP_TOLERANCE = 24
+# Share of the border that has to be backdrop for the image to count as a plain backdrop
+MIN_PLAIN_BORDER = .6
+
+
+def border(array):
+    return np.concatenate([array[0], array[-1], array[1:-1, 0], array[1:-1, -1]])
+
+
+def fill_runs(mask, reached):
+    """Extend ``reached`` to every run of ``mask`` along each row that it touches."""
+    height, width = mask.shape
+    # A spare False column stops runs carrying on from the end of one row into the next
+    flat = np.pad(mask, ((0, 0), (0, 1))).ravel()
+    seeds = np.pad(reached, ((0, 0), (0, 1))).ravel()
+
+    starts = flat & ~np.concatenate(([False], flat[:-1]))
+    run_ids = np.cumsum(starts) * flat
+    hit = np.zeros(run_ids.max() + 1, dtype=bool)
+    hit[run_ids[seeds & flat]] = True
+    # Id 0 is everything outside the runs
+    hit[0] = False
+    return hit[run_ids].reshape(height, width + 1)[:, :width]
+
+
+def flood_from_border(mask):
+    """The pixels of ``mask`` connected to the edge of the image through ``mask``."""
+    reached = np.zeros_like(mask)
+    reached[[0, -1], :] = mask[[0, -1], :]
+    reached[:, [0, -1]] = mask[:, [0, -1]]
+
+    # Whole runs are filled at a time, alternating rows and columns, so this takes a
+    # pass per turn in the backdrop's outline rather than per pixel
+    count = -1
+    while count != np.count_nonzero(reached):
+        count = np.count_nonzero(reached)
+        reached = fill_runs(mask, reached)
+        reached = fill_runs(mask.T, reached.T).T
+    return reached
+
+
+def remove_plain_background(img, tolerance=BACKDROP_TOLERANCE):
+    """
+    Cut the subject of ``img`` out of a plain backdrop, like the white background the
+    portrait prompts ask for.  The backdrop is everything close to the border's colour
+    that's connected to the border.  Returns an RGBA image, or None if the border isn't
+    mostly one colour, in which case something smarter is needed.
+    """
+    rgb = np.asarray(img.convert('RGB'))
+    pixels = rgb.astype(np.int16)
+
+    backdrop = np.median(border(pixels), axis=0)
+    difference = np.abs(pixels - backdrop).max(axis=2)
+    plain = difference <= tolerance
+    if border(plain).mean() < MIN_PLAIN_BORDER:
+        return None
+
+    background = flood_from_border(plain)
+
+    # Fade the subject's outermost pixels by how close they are to the backdrop, so
+    # anti-aliased edges don't leave a halo
+    around = np.pad(background, 1)
+    edge = ~background & (around[:-2, 1:-1] | around[2:, 1:-1] | around[1:-1, :-2] | around[1:-1, 2:])
+    alpha = np.full(plain.shape, 255, dtype=np.uint8)
+    alpha[background] = 0
+    alpha[edge] = np.clip(difference[edge] * 255 // (tolerance * 4), 0, 255)
+
+    return Image.fromarray(np.dstack([rgb, alpha]), 'RGBA')
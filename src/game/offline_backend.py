@@ -0,0 +1,144 @@
+import asyncio
+import json
+import random
+import re
+import time
+
+from .utils import canonical_hash
+
+GENRES = ['Fantasy', 'Adventure', 'Comedy', 'Mystery', 'Horror', 'Western', 'Science-Fiction', 'Steampunk']
+TONES = ['Whimsical', 'Gritty', 'Vibrant', 'Moody', 'Painterly', 'Neon-soaked', 'Gothic', 'Sunlit']
+PLACES = ['the Shattered Coast', 'Emberfall', 'the Glass Desert', 'Old Fife', 'the Hollow Spire', 'Duskmere']
+THREATS = ['a creeping plague of shadow', 'a tyrant who stole the sun', 'an army of clockwork knights',
+           'a curse that turns rivers to stone', 'a storm that never ends']
+BOSS_NAMES = ['Zargothrax', 'Malgrim the Unbound', 'Queen Vespera', 'The Ashen Warden', 'Korvath Ironmaw']
+APPEARANCE = ['weathered leather coat', 'glowing amber eyes', 'scarred left cheek', 'braided silver hair',
+              'heavy iron gauntlets', 'tattered crimson cloak', 'crackling blue aura', 'jagged obsidian armor',
+              'towering horned helm', 'wide confident grin']
+SCENERY = ['crumbling stone towers', 'misty pine forest', 'storm clouds overhead', 'lava-lit canyon floor',
+           'moonlit ruined courtyard', 'golden wheat fields', 'frozen mountain pass', 'flickering lantern light']
+ATTACK_NAMES = ['Thunder Strike', 'Shadow Lash', 'Second Wind', 'Iron Cyclone', 'Venom Fang', 'Mending Light',
+                'Skull Crusher', 'Flame Burst']
+HEAL_ITEMS = ['Healing Draught', 'Phoenix Feather', 'Bandage Roll']
+DAMAGE_ITEMS = ['Fire Bomb', 'Throwing Axe', 'Cursed Dagger']
+LINES = ['You have no idea what you are up against.', 'I have come too far to turn back now.',
+         'Your reign ends today.', 'Foolish. Many have tried before you.', 'Then I will be the last.',
+         'Enough talk. Let us finish this.', 'It did not have to end this way.', 'Remember this day.']
+
+
+class OfflineBackend:
+    """
+    Local stand-in for the chat completion backend.  It recognises each kind of request
+    StoryTeller makes and answers it from templates, in the same shape the real model is
+    asked for.  Answers are a function of the payload and ``seed`` only, so runs are
+    repeatable.
+
+    ``latency`` is the artificial delay per request in seconds, either a number or a
+    function of a ``random.Random`` for drawing it from a distribution.  Streaming spends
+    the same delay spread over the tokens.
+    """
+
+    def __init__(self, latency=0., seed=0):
+        self.latency = latency
+        self.seed = seed
+        # Keeps template answers apart from real completions in the story cache
+        self.cache_id = f'offline-{seed}'
+
+    def rng(self, payload):
+        return random.Random(canonical_hash([self.seed, payload]))
+
+    def delay(self, rng):
+        if callable(self.latency):
+            return max(0., self.latency(rng))
+        return self.latency
+
+    def complete(self, model, payload):
+        rng = self.rng(payload)
+        time.sleep(self.delay(rng))
+        return self.respond(payload, rng)
+
+    def stream(self, model, payload):
+        rng = self.rng(payload)
+        delay = self.delay(rng)
+        tokens = re.findall(r'\S+\s*|\s+', self.respond(payload, rng))
+        for token in tokens:
+            time.sleep(delay / len(tokens))
+            yield token
+
+    async def acomplete(self, model, payload):
+        rng = self.rng(payload)
+        await asyncio.sleep(self.delay(rng))
+        return self.respond(payload, rng)
+
+    def respond(self, payload, rng):
+        request = payload[-1]['content']
+        name = self.find(r'character name (.+?), their job', request) or self.find(r'^(.+?) is a ', request) or 'the hero'
+
+        if 'Respond with only a JSON object' in request:
+            bundle = {
+                'prompt': rng.sample(APPEARANCE, 5),
+                'attacks': self.attacks(rng),
+                'inventory': self.items(rng),
+            }
+            if '"name"' in request.split('"prompt"')[0]:
+                bundle['name'] = rng.choice(BOSS_NAMES)
+            return json.dumps(bundle)
+        if 'what genre of story' in request:
+            return self.numbered(rng.sample(GENRES, 3))
+        if 'visual artistic style' in request:
+            return ', '.join(rng.sample(TONES, 3))
+        if 'prologue for the story' in request:
+            return f'In {rng.choice(PLACES)}, {name} has always kept to the work at hand.  But when ' \
+                   f'{rng.choice(THREATS)} falls across the land, only {name} stands between the people ' \
+                   f'and ruin, and the road ahead leads straight to the one who started it all.'
+        if 'Create a title' in request:
+            return f'The Legend of {rng.choice(PLACES).replace("the ", "").title()}'
+        if 'list of four attacks' in request:
+            return json.dumps(self.attacks(rng))
+        if 'list of two items' in request:
+            return json.dumps(self.items(rng))
+        if 'Generate a name for the final boss' in request:
+            return rng.choice(BOSS_NAMES)
+        if 'lines of dialogue between' in request:
+            speakers = re.search(r'dialogue between (.+?) and (.+?)(?:, after| from immediately)', request)
+            first, second = speakers.groups() if speakers else ('Hero', 'Villain')
+            lines = rng.sample(LINES, 6)
+            return '\n'.join(f'{(first, second)[i % 2]}: {line}' for i, line in enumerate(lines))
+        if 'single paragraph ending' in request:
+            if 'victorious' in request:
+                return f'With the final blow struck, peace returns to {rng.choice(PLACES)}, and songs ' \
+                       f'of the battle are sung for generations.'
+            return f'The darkness spreads unchecked across {rng.choice(PLACES)}, and the hero\'s name ' \
+                   f'fades into a cautionary tale.'
+        if 'five phrases' in request:
+            if 'background' in request or 'image' in request:
+                return self.numbered(rng.sample(SCENERY, 5))
+            return self.numbered(rng.sample(APPEARANCE, 5))
+        if 'Describe the appearance' in request:
+            return f'A figure with {", ".join(rng.sample(APPEARANCE, 3))}, who carries the weight of ' \
+                   f'many battles in every step.'
+        return 'The story continues.'
+
+    @staticmethod
+    def find(pattern, text):
+        match = re.search(pattern, text)
+        return match.group(1) if match else None
+
+    @staticmethod
+    def numbered(phrases):
+        return '\n'.join(f'{i + 1}. {phrase}' for i, phrase in enumerate(phrases))
+
+    @staticmethod
+    def attacks(rng):
+        names = rng.sample(ATTACK_NAMES, 4)
+        # The last move heals, like the model is asked to allow for
+        return [{'name': name,
+                 'damage': -rng.randint(100, 250) if i == 3 else rng.randint(80, 350),
+                 'accuracy': rng.randint(55, 100),
+                 'description': 'A move worth remembering'}
+                for i, name in enumerate(names)]
+
+    @staticmethod
+    def items(rng):
+        return [{'name': rng.choice(HEAL_ITEMS), 'damage': -rng.randint(150, 400), 'description': 'Restores lost health'},
+                {'name': rng.choice(DAMAGE_ITEMS), 'damage': rng.randint(150, 400), 'description': 'Hurts the target badly'}]
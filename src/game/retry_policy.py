@@ -0,0 +1,123 @@
+import collections
+import random
+import threading
+import time
+
+import requests
+
+# (connect, read) seconds for one attempt at a request.  txt2img can sit in the server's
+# queue behind other jobs, so it gets longer to answer.
+DEFAULT_TIMEOUT = (5., 30.)
+REQUEST_TIMEOUTS = {
+    '/sdapi/v1/txt2img': (5., 180.),
+    '/internal/progress': (5., 5.),
+    '/sdapi/v1/progress': (5., 5.),
+}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Every server's circuit breaker is open, so the request wasn't sent."""
+
+
+class CircuitBreaker:
+    """
+    Trips after ``threshold`` failures in a row, counted across every job sent to its
+    server, failing requests to the server fast for ``cooldown`` seconds.  After that it's
+    half-open: a single request goes through as a probe while the rest stay away.  The
+    probe succeeding closes the breaker; failing trips it again for another cooldown.
+    """
+
+    def __init__(self, threshold: float, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def available(self):
+        """Whether a request can be sent: the breaker is closed, or a probe is due and none is out."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            return not self.probing and time.monotonic() - self.opened_at >= self.cooldown
+
+    def sending(self):
+        """Note a request going out; while the breaker is open, it's the probe."""
+        with self.lock:
+            if self.opened_at is not None:
+                self.probing = True
+
+    def succeeded(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def failed(self):
+        with self.lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def abandoned(self):
+        """The request ended without saying whether the server is up; let another probe go."""
+        with self.lock:
+            self.probing = False
+
+
+class RetryPolicy:
+    """
+    How diffusion requests are retried: at most ``attempts`` tries each with a per-attempt
+    timeout, exponential backoff with full jitter between tries at the same server, and a
+    circuit breaker per server, even when there's only one.  The breaker's threshold is
+    above ``attempts``, so one job's bad luck can't trip it; it takes failures from
+    several.  ``counters`` tallies attempts and how they went, across every request made
+    under the policy.
+    """
+
+    def __init__(self, attempts: int = 3, base_delay: float = .5, max_delay: float = 8.,
+                 breaker_threshold: int = 6, breaker_cooldown: float = 30., solo_breaker_cooldown: float = 5.,
+                 timeouts=None):
+        if breaker_threshold <= attempts:
+            raise ValueError('breaker_threshold has to be above attempts, or one job can trip the breaker')
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.solo_breaker_cooldown = solo_breaker_cooldown
+        self.timeouts = REQUEST_TIMEOUTS if timeouts is None else timeouts
+        self.counters = collections.Counter()
+        self.lock = threading.Lock()
+
+    def timeout(self, path: str):
+        return self.timeouts.get(path.split('?')[0], DEFAULT_TIMEOUT)
+
+    def breaker(self, fallback: bool = True):
+        """
+        A circuit breaker for one server.  Without a ``fallback`` to send requests to
+        instead, it's half-open again after the shorter ``solo_breaker_cooldown``, so a
+        server that's down fails jobs fast without a blip shutting it out for long.
+        """
+        return CircuitBreaker(self.breaker_threshold,
+                              self.breaker_cooldown if fallback else self.solo_breaker_cooldown)
+
+    @staticmethod
+    def should_retry(error: Exception):
+        # Server trouble is worth another go; a request the server rejected isn't
+        if isinstance(error, requests.exceptions.HTTPError):
+            return error.response is not None and error.response.status_code >= 500
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def backoff(self, attempt: int):
+        time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def count(self, event: str):
+        with self.lock:
+            self.counters[event] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
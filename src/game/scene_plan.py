@@ -0,0 +1,182 @@
+import dataclasses
+from typing import Iterable
+
+from .asset_store import AssetStore
+from .task_graph import Task
+
+
+@dataclasses.dataclass(frozen=True)
+class SceneNeeds:
+    """
+    What a scene shows of the generated game.  It can't start until the story ``fields``
+    and ``images`` (image task names) are done.  ``streamed`` fields and ``previewed``
+    images it shows while they're still generating, so they're fetched for it but not
+    waited on.
+    """
+    fields: tuple[str, ...] = ()
+    images: tuple[str, ...] = ()
+    streamed: tuple[str, ...] = ()
+    previewed: tuple[str, ...] = ()
+
+
+# What each scene of the game needs generated.  Kept apart from the scenes themselves so
+# it can be read without arcade, e.g. by the headless benchmark.
+SCENE_NEEDS = {
+    'setup': SceneNeeds(),
+    'loading': SceneNeeds(),
+    # The card is shown from previews while it generates
+    'title': SceneNeeds(fields=('title',), previewed=('title background',)),
+    'text dump': SceneNeeds(streamed=('prologue',), previewed=('prologue background',)),
+    # The background is shown up front; the dialogue is parsed as it streams, and the
+    # portraits fade in as they're generated
+    'prologue cutscene': SceneNeeds(fields=('final_boss_name',),
+                                    images=('prologue background',),
+                                    streamed=('prologue_dialogue',),
+                                    previewed=('hero portrait', 'boss portrait')),
+    'battle': SceneNeeds(fields=('main_character_attacks', 'main_character_inventory',
+                                 'final_boss_attacks', 'final_boss_inventory', 'final_boss_name'),
+                         images=('battle background',),
+                         previewed=('hero portrait', 'boss portrait')),
+    'epilogue cutscene': SceneNeeds(images=('epilogue-victory background', 'epilogue-defeat background'),
+                                    streamed=('epilogue_victory_dialogue', 'epilogue_defeat_dialogue')),
+    'ending': SceneNeeds(previewed=('title background',)),
+}
+
+# The game's scenes in playthrough order
+GAME_FLOW = ('setup', 'loading', 'title', 'text dump', 'prologue cutscene', 'battle', 'epilogue cutscene', 'ending')
+
+
+@dataclasses.dataclass
+class Scene:
+    name: str
+    controller: type | None = None
+    kwargs: dict = dataclasses.field(default_factory=dict)
+    needs: SceneNeeds = SceneNeeds()
+    # Music to switch to when the scene starts, if any
+    music: str | None = None
+
+
+def scene(name, controller=None, music=None, kwargs=None):
+    """Scene ``name`` of SCENE_NEEDS, shown by ``controller(state, callback, **kwargs)``."""
+    return Scene(name, controller, kwargs or {}, SCENE_NEEDS[name], music)
+
+
+def image_deadlines(scenes: Iterable[Scene]):
+    """Image task name -> index of the first scene that shows it."""
+    deadlines = {}
+    for index, scene in enumerate(scenes):
+        for name in scene.needs.images + scene.needs.previewed:
+            deadlines.setdefault(name, index)
+    return deadlines
+
+
+class ScenePlan:
+    """
+    Generates what a sequence of scenes needs, in playthrough order.  One TaskGraph holds
+    every story step and image task any scene needs, and each task is ranked by the first
+    scene that needs it, itself or through something that reads its output.  So the
+    workers go to what the next scene needs first and only then move further ahead.
+
+    Each field and image is published to ``assets`` as it's generated, and
+    ``ready(index)`` resolves as soon as the ones scene ``index`` waits on are in.  The
+    readiness futures exist from the start; the graph is only made by ``build``, once
+    the story has everything it starts from.
+    """
+
+    def __init__(self, scenes: list[Scene], assets: AssetStore = None, streams: dict = None):
+        self.scenes = scenes
+        self.assets = AssetStore() if assets is None else assets
+        # Field -> TextStream for the steps to stream into
+        self.streams = {} if streams is None else streams
+        self.milestones = [self.assets.ready(scene.needs.fields + scene.needs.images) for scene in scenes]
+
+        self.story_teller = None
+        self.graph = None
+        # Task name -> index of the first scene that needs it
+        self.first_needed = {}
+        # Tasks each scene waits on, itself or through what they read
+        self.waited = [set() for _ in scenes]
+        self.finished = set()
+
+    def build(self, story_teller, image_tasks: dict):
+        """Make the graph generating what the scenes need that ``story_teller`` doesn't have yet."""
+        self.story_teller = story_teller
+        scenes = self.scenes
+
+        fields, images = [], []
+        for scene in scenes:
+            needs = scene.needs
+            fields += [field for field in needs.fields + needs.streamed if field not in fields]
+            images += [name for name in needs.images + needs.previewed if name not in images]
+        self.graph = story_teller.story_graph(targets=fields, extra_tasks=[self.publishing(image_tasks[name])
+                                                                           for name in images],
+                                              streams=self.streams)
+        # Fields the story already had aren't generated again
+        for field in fields:
+            if field not in self.graph.writers:
+                self.assets.put(field, getattr(story_teller, field))
+
+        for index, scene in enumerate(scenes):
+            needs = scene.needs
+            waited = self.closure(needs.fields, needs.images)
+            for name in waited | self.closure(needs.streamed, needs.previewed):
+                self.first_needed.setdefault(name, index)
+            self.waited[index] = waited
+        return self.graph
+
+    def publishing(self, task: Task):
+        """``task``, publishing the image its future resolves with to the asset store."""
+        def publish(future):
+            if future.exception() is None:
+                self.assets.put(task.name, future.result())
+
+        def fn():
+            future = task.fn()
+            future.add_done_callback(publish)
+            return future
+        return dataclasses.replace(task, fn=fn)
+
+    def closure(self, fields, images):
+        """Names of the tasks in the graph that produce ``fields`` and ``images``, and everything they read."""
+        stack = [self.graph.writers[field] for field in fields if field in self.graph.writers]
+        stack += [name for name in images if name in self.graph.tasks]
+        names = set()
+        while stack:
+            name = stack.pop()
+            if name not in names:
+                names.add(name)
+                stack.extend(self.graph.dependencies[name])
+        return names
+
+    def priority(self, name):
+        return self.first_needed.get(name, len(self.scenes))
+
+    def ready(self, index: int):
+        """Future that resolves once scene ``index`` has everything it waits on."""
+        return self.milestones[index]
+
+    def progress(self, index: int):
+        """How many of the tasks scene ``index`` waits on are done, and how many there are."""
+        waited = self.waited[index]
+        # Only membership tests, as tasks finish on the plan's thread while this is asked
+        return sum(name in self.finished for name in waited), len(waited)
+
+    def fail(self, error: BaseException):
+        """Fail everything not generated yet, so nothing waiting on the plan waits forever."""
+        self.assets.fail(error)
+        for stream in list(self.streams.values()):
+            if not stream.done:
+                stream.fail(error)
+
+    def task_done(self, name):
+        self.finished.add(name)
+        for field in self.graph.tasks[name].writes:
+            self.assets.put(field, getattr(self.story_teller, field))
+
+    def run(self, max_workers: int, lanes: dict[str, int] | None = None):
+        try:
+            self.graph.run(max_workers=max_workers, on_task_done=self.task_done, priority=self.priority,
+                           lanes=lanes)
+        except Exception as e:
+            self.fail(e)
+            raise
@@ -1,9 +1,9 @@
 import arcade
 from ..game_types import GameState
 from ..entity import Entity
+from ..drawable import LiveDrawable, LiveSprite
 from textwrap import wrap as wrap_text
 import random
-import json
 
 PLAYER_SCALING = 0.8
 BOSS_SCALING = 0.8
@@ -62,25 +62,23 @@ class BattleView(arcade.View):
         self.player_health = PLAYER_MAX_HP
         self.boss_items_left = 2
         # self.boss_final_wind_flag = False
-        self.player_attacks = json.loads(self.state.story_teller.main_character_attacks)
-        self.player_items = json.loads(self.state.story_teller.main_character_inventory)
-        self.enemy_attacks = json.loads(self.state.story_teller.final_boss_attacks)
-        self.enemy_items = json.loads(self.state.story_teller.final_boss_inventory)
+        # Parsed and validated by the StoryTeller when it generated them
+        self.player_attacks = self.state.story_teller.main_character_attacks
+        self.player_items = self.state.story_teller.main_character_inventory
+        self.enemy_attacks = self.state.story_teller.final_boss_attacks
+        self.enemy_items = self.state.story_teller.final_boss_inventory
         self.main_actions = ["Attack", "Item"]
-        self.subactions = {
-            "Attack": [self.player_attacks[0]["name"], self.player_attacks[1]["name"], self.player_attacks[2]["name"], self.player_attacks[3]["name"]],
-            "Item": [self.player_items[0]["name"], self.player_items[1]["name"]],
-            # "Act": ["Run", "Bribe", "Giddy Up"],
+        self.actions = {
+            "Attack": self.player_attacks,
+            "Item": self.player_items,
         }
-        self.actions_descriptions = {
-            self.player_attacks[0]["name"]: self.player_attacks[0]["description"],
-            self.player_attacks[1]["name"]: self.player_attacks[1]["description"],
-            self.player_attacks[2]["name"]: self.player_attacks[2]["description"],
-            self.player_attacks[3]["name"]: self.player_attacks[3]["description"],
-            self.player_items[0]["name"]: self.player_items[0]["description"],
-            self.player_items[1]["name"]: self.player_items[1]["description"],
-
-            # "Run": "Run away from the battle.",
+        self.subactions = {main_action: [action.name for action in actions] for main_action, actions in self.actions.items()}
+        # Wrapped description, effect and accuracy text for each subaction, so drawing doesn't redo it
+        self.subaction_text = {
+            main_action: [(wrap_text(action.description, 32), action.effect_text,
+                           "Accuracy: " + str(action.accuracy) + "%" if main_action == "Attack" else "")
+                          for action in actions]
+            for main_action, actions in self.actions.items()
         }
 
         self.player_hp_bar = HPStatusBar(
@@ -95,27 +93,24 @@ class BattleView(arcade.View):
             arcade.color.DARK_GRAY, arcade.color.RED, arcade.color.BLACK)
 
     def on_show_view(self):
-        background_path = self.state.image_generator.get_background('battle')
-        self.background = arcade.load_texture(background_path)
+        # Each swaps in the refined image if it lands mid-battle
+        image_generator = self.state.image_generator
+        self.background = LiveDrawable(image_generator.preview('battle'))
 
+        self.player_sprite = LiveSprite(image_generator.preview(self.state.story_teller.player_name), PLAYER_SCALING)
+        self.player_sprite.center_x = self.width / 6
+        self.player_sprite.center_y = 440
 
-    def on_draw(self):
-        self.clear()
+        self.enemy_sprite = LiveSprite(image_generator.preview(self.state.story_teller.final_boss_name), BOSS_SCALING)
+        self.enemy_sprite.center_x = (self.width / 2) + (self.width / 3)
+        self.enemy_sprite.center_y = 500
 
 
-        player_image = self.state.image_generator.get_portrait(self.state.story_teller.player_name, look_right=True)
-        arcade.draw_lrwh_rectangle_textured(0, 0, self.width, self.height, self.background)
+    def on_draw(self):
+        self.clear()
 
-        self.player_sprite = arcade.Sprite(player_image, PLAYER_SCALING)
-        self.player_sprite.center_x = self.width / 6
-        self.player_sprite.center_y = 440
+        self.background.draw(0, 0, self.width, self.height)
         self.player_sprite.draw()
-
-        enemy_image = self.state.image_generator.get_portrait(self.state.story_teller.final_boss_name)
-        self.enemy_sprite = arcade.Sprite(enemy_image, BOSS_SCALING)
-
-        self.enemy_sprite.center_x = (self.width / 2) + (self.width / 3) 
-        self.enemy_sprite.center_y = 500
         self.enemy_sprite.draw()
 
         self.player_hp_bar.draw()
@@ -156,37 +151,19 @@ class BattleView(arcade.View):
                 arcade.draw_text(subaction, self.width / 2 - 100, MENU_HEIGHT - (i + 1) * 30, color, font_size=21)
 
             # Draw the description for the current subaction
-            if self.current_subaction in self.actions_descriptions:
-                description = self.actions_descriptions.get(self.current_subaction, "")
-                action_effect_text = ""
-                accuracy_text = ""
-
-                if self.current_main_action_index == 0:
-                    action_effect = int(self.player_attacks[self.current_subaction_index]["damage"])
-                    action_accuracy = str(self.player_attacks[self.current_subaction_index]["accuracy"])
-                    accuracy_text += "Accuraracy: " + action_accuracy + "%"
-                elif self.current_main_action_index == 1:
-                    action_effect = int(self.player_items[self.current_subaction_index]["damage"])
-                
-                if action_effect > 0: 
-                    action_effect_text += "Deals: " + str(action_effect) +  " Damage"
-                else:
-                    action_effect_text += "Heals: " + str(abs(action_effect)) +  "HP"
+            lines, action_effect_text, accuracy_text = self.subaction_text[self.current_main_action][self.current_subaction_index]
+            last_y = 0
+            for i, line in enumerate(lines):
+                y = MENU_HEIGHT / 2 + (len(lines) / 2 - i) * 25  # Dynamically adjust y position based on how many lines there are
+                arcade.draw_text(line, self.width * 2 / 3 + 50, y, arcade.color.BLACK, font_size=16,
+                                width=self.width / 4, align="left")
+                last_y = y
 
-                lines = wrap_text(description, 32)
-                last_y = 0
-                for i, line in enumerate(lines):
-                    y = MENU_HEIGHT / 2 + (len(lines) / 2 - i) * 25  # Dynamically adjust y position based on how many lines there are
-                    arcade.draw_text(line, self.width * 2 / 3 + 50, y, arcade.color.BLACK, font_size=16,
-                                    width=self.width / 4, align="left")
-                    last_y = y
-                
-          
-                arcade.draw_text(action_effect_text, self.width * 2 / 3 + 50, last_y - 30, arcade.color.BLACK, font_size=16, 
-                                    width=self.width / 4, align="left")
+            arcade.draw_text(action_effect_text, self.width * 2 / 3 + 50, last_y - 30, arcade.color.BLACK, font_size=16,
+                                width=self.width / 4, align="left")
 
-                arcade.draw_text(accuracy_text, self.width * 2 / 3 + 50, last_y - 55, arcade.color.BLACK, font_size=16, 
-                                    width=self.width / 4, align="left")
+            arcade.draw_text(accuracy_text, self.width * 2 / 3 + 50, last_y - 55, arcade.color.BLACK, font_size=16,
+                                width=self.width / 4, align="left")
 
 
 
@@ -220,14 +197,10 @@ class BattleView(arcade.View):
             elif key in (arcade.key.SPACE, arcade.key.ENTER):
                 if self.current_panel == 1:
                     if self.current_main_action_index == 0:
-                        damage = int(self.player_attacks[self.current_subaction_index]["damage"])
-
-                        if isinstance(self.player_attacks[self.current_subaction_index]["accuracy"], str):
-                            accuracy = int(self.player_attacks[self.current_subaction_index]["accuracy"].rstrip('%'))
-                        else:
-                            accuracy = int(self.player_attacks[self.current_subaction_index]["accuracy"])
+                        attack = self.player_attacks[self.current_subaction_index]
+                        damage = attack.damage
 
-                        if random.randrange(100) < accuracy:
+                        if random.randrange(100) < attack.accuracy:
                             if damage >= 0:
                                 player_action_text = "Attack hit for " + str(damage) + " damage"
                             else:
@@ -237,8 +210,9 @@ class BattleView(arcade.View):
                             player_action_text = "Player's attack missed..."
 
                     elif self.current_main_action_index == 1:
-                        damage = int(self.player_items[self.current_subaction_index]["damage"])
-                        player_action_text = "Player used item " + self.player_items[self.current_subaction_index]["name"]
+                        item = self.player_items[self.current_subaction_index]
+                        damage = item.damage
+                        player_action_text = "Player used item " + item.name
 
                     self.post_action_text = player_action_text
                     print(player_action_text)
@@ -295,8 +269,8 @@ class BattleView(arcade.View):
                 if self.boss_items_left > 0 and random.randrange(100) < 30: # Should boss use item
                      # Randomly pick an item
                     enemy_action_index = random.randint(0, 1)
-                    item_name = self.enemy_attacks[enemy_action_index]["name"]
-                    damage = int(self.enemy_items[enemy_action_index]["damage"])
+                    item_name = self.enemy_items[enemy_action_index].name
+                    damage = self.enemy_items[enemy_action_index].damage
                     if damage > 0:
                         self.player_health -= damage
                         boss_action_text = self.state.story_teller.final_boss_name + " attacks with item " + item_name + " for " + str(damage) + " damage"
@@ -307,23 +281,20 @@ class BattleView(arcade.View):
                 else:
                     # Randomly pick an attack
                     enemy_action_index = random.randint(0, 3)
-                    attack_name = self.enemy_attacks[enemy_action_index]["name"]
-                    damage = int(self.enemy_attacks[enemy_action_index]["damage"])
-                    if isinstance(self.enemy_attacks[enemy_action_index]["accuracy"], str):
-                        accuracy = int(self.enemy_attacks[enemy_action_index]["accuracy"].rstrip('%'))
-                    else:
-                        accuracy = int(self.enemy_attacks[enemy_action_index]["accuracy"])
-
-                        if random.randrange(100) < accuracy:
-                            if damage > 0:
-                                self.player_health -= damage
-                                boss_action_text = self.state.story_teller.final_boss_name + " attacks with " + attack_name + " for " + str(damage) + " damage"
-                            else:
-                                self.boss_health -= damage
-                                boss_action_text = self.state.story_teller.final_boss_name + " heals with " + attack_name + " for " + str(abs(damage)) + "HP"
+                    attack_name = self.enemy_attacks[enemy_action_index].name
+                    damage = self.enemy_attacks[enemy_action_index].damage
+                    accuracy = self.enemy_attacks[enemy_action_index].accuracy
+
+                    if random.randrange(100) < accuracy:
+                        if damage > 0:
+                            self.player_health -= damage
+                            boss_action_text = self.state.story_teller.final_boss_name + " attacks with " + attack_name + " for " + str(damage) + " damage"
                         else:
-                            damage = 0
-                            boss_action_text = self.state.story_teller.final_boss_name + "'s attack missed..."
+                            self.boss_health -= damage
+                            boss_action_text = self.state.story_teller.final_boss_name + " heals with " + attack_name + " for " + str(abs(damage)) + "HP"
+                    else:
+                        damage = 0
+                        boss_action_text = self.state.story_teller.final_boss_name + "'s attack missed..."
 
                     # if damage > 0:
                     #     self.player_health -= damage
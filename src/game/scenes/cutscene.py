@@ -2,6 +2,8 @@ import arcade
 from ..game_types import GameState
 
 from game.background import Background
+from game.dialogue import DialogueParser
+from game.drawable import LiveDrawable
 
 import game.dialog_box as dialog_box
 
@@ -48,10 +50,11 @@ class Portrait(arcade.Section):
 
 
 class CutsceneView(arcade.View):
-    def __init__(self, state: GameState, is_done_callback):
+    def __init__(self, state: GameState, is_done_callback, epilogue=False):
         super().__init__()
         self.state = state
         self.done = is_done_callback
+        self.epilogue = epilogue
         self.width = state.window_size[0]
         self.height = state.window_size[1]
 
@@ -68,17 +71,16 @@ class CutsceneView(arcade.View):
                                      self.dialog_height,
                                      self.width,
                                      self.height - self.dialog_height)
-        if self.state.is_prologue:
-            background_path = self.state.image_generator.get_background('prologue')
+        if not self.epilogue:
+            background_name = 'prologue'
         else:
             if self.state.battle_won:
-                background_path = self.state.image_generator.get_background('epilogue-victory')
+                background_name = 'epilogue-victory'
             else:
-                background_path = self.state.image_generator.get_background('epilogue-defeat')
+                background_name = 'epilogue-defeat'
 
-        print(background_path)
-
-        self.bg_section.open(dialog_box.Drawable(texture = arcade.load_texture(background_path)))
+        # Starts on the draft if that's all there is, and swaps in the refined image
+        self.bg_section.open(LiveDrawable(self.state.image_generator.preview(background_name)))
 
         self.dialog_section = dialog_box.DialogBox(0,
                                                    0,
@@ -106,47 +108,54 @@ class CutsceneView(arcade.View):
         self.get_events_from_state()
 
     def get_events_from_state(self):
-        dialog = ""
-
-        if self.state.is_prologue:
-            dialog = self.state.story_teller.prologue_dialogue
+        if not self.epilogue:
+            field = 'prologue_dialogue'
         else:
             if self.state.battle_won:
-                dialog = self.state.story_teller.epilogue_victory_dialogue
+                field = 'epilogue_victory_dialogue'
             else:
-                dialog = self.state.story_teller.epilogue_defeat_dialogue
+                field = 'epilogue_defeat_dialogue'
 
-        character_side = {}
-        character_portrait = {}
-        side = 0
+        # Prefer the stream so the scene can start before the dialogue has finished
+        self.dialogue = self.state.text_streams.get(field, getattr(self.state.story_teller, field))
+        self.parser = DialogueParser()
+        self.parsed_length = 0
+        self.character_side = {}
+        self.character_portrait = {}
+        self.side = 0
 
-        events = []
+        self.open(self.parse_new_events())
 
-        lines = dialog.strip().split('\n')
+    def dialogue_complete(self):
+        return isinstance(self.dialogue, str) or self.dialogue.done
 
-        for line in lines:
-            if line.find(': ') == -1:
-                continue
+    def parse_new_events(self):
+        complete = self.dialogue_complete()
+        text = self.dialogue if isinstance(self.dialogue, str) else self.dialogue.text
 
-            character, text = line.split(': ', 1)
+        lines = self.parser.feed(text[self.parsed_length:])
+        self.parsed_length = len(text)
+        if complete:
+            lines += self.parser.finish()
 
-            if character not in character_side:
-                character_side[character] = side
-                side = 1 - side
+        return [self.make_event(character, line) for character, line in lines]
 
-            if character not in character_portrait:
-                char_name = self.state.story_teller.player_name if character_side[character] == 0 else self.state.story_teller.final_boss_name
-                portrait_texture = self.state.image_generator.get_portrait(char_name)
-                character_portrait[character] = arcade.load_texture(portrait_texture)
+    def make_event(self, character, line):
+        if character not in self.character_side:
+            self.character_side[character] = self.side
+            self.side = 1 - self.side
 
-            events.append(CutsceneEvent(
-                [line],
-                dialog_box.Drawable(texture = character_portrait[character]),
-                character_side[character],
-                dialog_box.Drawable(color = arcade.color.GREEN)
-            ))
+        if character not in self.character_portrait:
+            char_name = self.state.story_teller.player_name if self.character_side[character] == 0 else self.state.story_teller.final_boss_name
+            self.character_portrait[character] = LiveDrawable(self.state.image_generator.preview(char_name),
+                                                              color=(0, 0, 0, 0))
 
-        self.open(events)
+        return CutsceneEvent(
+            [line],
+            self.character_portrait[character],
+            self.character_side[character],
+            dialog_box.Drawable(color = arcade.color.GREEN)
+        )
 
     def dialog_next(self):
         self.dialog_section.next()
@@ -162,11 +171,12 @@ class CutsceneView(arcade.View):
             self.done()
             return
 
-        event = self.events[self.index]
-        self.trigger(event)
+        if self.index < len(self.events):
+            event = self.events[self.index]
+            self.trigger(event)
 
     def finished(self):
-        return self.index == len(self.events)
+        return self.index == len(self.events) and self.dialogue_complete()
 
     def next(self):
         self.index = min(self.index + 1, len(self.events))
@@ -176,8 +186,10 @@ class CutsceneView(arcade.View):
             self.done()
             return
 
-        event = self.events[self.index]
-        self.trigger(event)
+        # Otherwise wait in on_update for the next line to stream in
+        if self.index < len(self.events):
+            event = self.events[self.index]
+            self.trigger(event)
 
     def trigger(self, event: CutsceneEvent):
         self.dialog_section.close()
@@ -192,7 +204,17 @@ class CutsceneView(arcade.View):
         self.right_char_portrait_section.is_active = event.portrait_side == 1
 
     def on_update(self, delta_time: float):
-        pass
+        if self.index < len(self.events) or isinstance(self.dialogue, str):
+            return
+
+        # Caught up with the stream: pick up whatever lines have completed since
+        self.events += self.parse_new_events()
+
+        if self.finished():
+            self.state.is_prologue = False
+            self.done()
+        elif self.index < len(self.events):
+            self.trigger(self.events[self.index])
 
     def on_draw(self):
         arcade.start_render()
@@ -216,7 +238,7 @@ class CutsceneView(arcade.View):
 class CutsceneController:
     view: CutsceneView
 
-    def __init__(self, state: GameState, is_done_callback):
+    def __init__(self, state: GameState, is_done_callback, epilogue=False):
         print("CutsceneController")
         self.done = is_done_callback
-        self.view = CutsceneView(state, is_done_callback)
+        self.view = CutsceneView(state, is_done_callback, epilogue=epilogue)
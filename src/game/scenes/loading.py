@@ -33,9 +33,7 @@ class LoadingView(arcade.View):
         self.width = state.window_size[0]
         self.height = state.window_size[1]
 
-        self.content = "Generating world..."
-        self.content += "\n" * 10
-        self.content += random.choice(TOOLTIPS)
+        self.tooltip = random.choice(TOOLTIPS)
 
         # Add sections for each of the areas:
         self.dialog_section = dialog_box.DialogBox(0,
@@ -47,16 +45,26 @@ class LoadingView(arcade.View):
 
         self.section_manager.add_section(self.dialog_section)
 
-        self.dialog_section.open([self.content])
-        self.time_elapsed = 0
+        self.dialog_section.open([self.message()])
+
+    def message(self):
+        message = "Generating world..."
+        plan = self.state.scene_plan
+        if plan is not None:
+            done, total = plan.progress(self.state.scene_index + 1)
+            if total:
+                message += f" {done}/{total}"
+        return message + "\n" * 10 + self.tooltip
 
     def dialog_next(self):
         pass
 
     def on_update(self, delta_time: float):
-        self.time_elapsed += delta_time
-        if self.time_elapsed > 2.:
+        # Waits for whatever the next scene can't start without, drawing as it goes
+        if self.state.next_scene_ready():
             self.done()
+        else:
+            self.dialog_section.content[0] = self.message()
 
 
     def on_draw(self):
@@ -2,6 +2,8 @@ import arcade
 from ..game_types import GameState
 
 import game.dialog_box as dialog_box
+from game.background import Background
+from game.drawable import Drawable, LiveDrawable
 
 class TextDumpView(arcade.View):
     def __init__(self, state: GameState, is_done_callback):
@@ -11,7 +13,8 @@ class TextDumpView(arcade.View):
         self.width = state.window_size[0]
         self.height = state.window_size[1]
 
-        self.content = self.state.story_teller.prologue
+        # Show the prologue as it streams in when there is a stream for it
+        self.content = self.state.text_streams.get('prologue', self.state.story_teller.prologue)
 
         # Add sections for each of the areas:
         self.dialog_section = dialog_box.DialogBox(0,
@@ -23,6 +26,14 @@ class TextDumpView(arcade.View):
         self.dialog_section.char_per_frame = 1
         self.dialog_section.open([self.content])
 
+        # The prologue background shows behind the text, as previews while it generates
+        self.bg_section = Background(0,
+                                     0,
+                                     self.width,
+                                     self.height)
+        self.bg_section.open(LiveDrawable(self.state.image_generator.preview('prologue')))
+        self.dialog_section.background = Drawable(color = [0, 0, 0, 200])
+
 
         # Add section for loading message
         self.loading_section = dialog_box.DialogBox(0,
@@ -34,6 +45,7 @@ class TextDumpView(arcade.View):
         self.loading_section.char_per_frame = -1
 
 
+        self.section_manager.add_section(self.bg_section)
         self.section_manager.add_section(self.dialog_section)
         # self.section_manager.add_section(self.loading_section)
         self.clicked = False
@@ -45,10 +57,9 @@ class TextDumpView(arcade.View):
 
     def on_update(self, delta_time: float):
 
-        if  self.clicked and \
-            self.state.story_generation_future is not None and \
-            self.state.story_generation_future.done():
-
+        # If the cutscene isn't ready yet, the Director waits for it on a loading screen
+        if self.clicked:
+            self.clicked = False
             print("text_dump DONE")
             self.done()
             self.dialog_section.close()
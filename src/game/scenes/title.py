@@ -1,7 +1,7 @@
 import arcade
 from ..game_types import GameState
 
-from game.drawable import Drawable
+from game.drawable import Drawable, LiveDrawable
 from game.mouse_section import MouseSection
 from game.background import Background
 
@@ -85,9 +85,8 @@ class TitleView(arcade.View):
         else:
             self.title_section.content = self.state.story_teller.title
 
-        background_path = self.state.image_generator.get_background('title-card')
-
-        self.bg_section.open(Drawable(texture = arcade.load_texture(background_path)))
+        # Shows the server's previews until the title card is finished
+        self.bg_section.open(LiveDrawable(self.state.image_generator.preview('title-card')))
         self.section_manager.add_section(self.mouse_section)
         self.section_manager.add_section(self.bg_section)
         self.section_manager.add_section(self.darkness_section)
@@ -5,7 +5,12 @@
 4) Create character class to store the "likeness" of a character
     - Store the character description, negative prompts, T pose (front and back), and attack types
 '''
+import functools
 import io
+import os
+import threading
+import time
+import uuid
 import random
 import base64
 import requests
@@ -14,45 +19,63 @@ from PIL import Image
 from tqdm import tqdm
 from pathlib import Path
 from typing import List, Dict
-import cv2
+
+from .endpoint_pool import EndpointPool
+from .image_scheduler import ImageScheduler
+from .image_stream import ImageStream
+from .matte import remove_plain_background
+from .retry_policy import RetryPolicy
+from .utils import canonical_hash
 
 SD_SERVER_IP = '172.30.0.94'
+# Comma separated base URLs of the diffusion servers to spread jobs over
+SD_SERVERS = [url.strip() for url in os.getenv('GAMEGEN_SD_SERVERS', f'http://{SD_SERVER_IP}:7860').split(',')]
 
 
 IMAGE_OUT_DIR = Path('/tmp/gamegen_img_cache')
-IMAGE_OUT_DIR.mkdir(parents=True, exist_ok=True)
 
 POSE_DIR = Path(__file__).parent / 'poses'
-assert POSE_DIR.exists(), f"Can't find pose img dir: {POSE_DIR}"
 
 SEED_MAX = 99999999
 
-def retry(times, exceptions):
+# Generated images are stored by a hash of the request that made them, and shared
+# between sessions.  The least recently used go once the cache passes either limit.
+IMAGE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+IMAGE_CACHE_MAX_AGE = 14 * 24 * 60 * 60
+# txt2img jobs sent to each diffusion server at once; the GPU box gets about twice the
+# throughput from two or three concurrent jobs as from one
+SD_MAX_PARALLEL = 2
+# Seconds between polls for a running job's live preview
+PREVIEW_INTERVAL = 1.
+# Full quality, and the quick first pass used in draft mode (roughly a seventh of the GPU time)
+FINAL_STEPS = 50
+DRAFT_STEPS = 12
+DRAFT_SIZE = 384
+# The server's default txt2img size, which full-quality images are made at
+FINAL_SIZE = 512
+# Pose photos are scaled down to this before they're sent; ControlNet's openpose
+# preprocessor works at 512px, so the full-size photos only made requests slower
+POSE_MAX_SIZE = 1024
+
+@functools.lru_cache(maxsize=None)
+def pose_payloads(path:Path):
     """
-    From: https://stackoverflow.com/questions/50246304/using-python-decorators-to-retry-request
-    Retry Decorator
-    Retries the wrapped function/method `times` times if the exceptions listed
-    in ``exceptions`` are thrown
-    :param times: The number of times to repeat the wrapped function/method
-    :type times: Int
-    :param Exceptions: Lists of exceptions that trigger a retry attempt
-    :type Exceptions: Tuple of Exceptions
+    Pose photo ``path`` as base64 JPEGs facing each way: ``(as taken, mirrored)``.  Made
+    the first time a pose is used and shared by every ImageGenerator after that.
     """
-    def decorator(func):
-        def newfn(*args, **kwargs):
-            attempt = 0
-            while attempt < times:
-                try:
-                    return func(*args, **kwargs)
-                except exceptions:
-                    print(
-                        'Exception thrown when attempting to run %s, attempt '
-                        '%d of %d' % (func, attempt, times)
-                    )
-                    attempt += 1
-            return func(*args, **kwargs)
-        return newfn
-    return decorator
+    pose = Image.open(path)
+    # Lets the JPEG decoder skip most of the full-size photo
+    pose.draft('RGB', (POSE_MAX_SIZE, POSE_MAX_SIZE))
+    pose = pose.convert('RGB')
+    pose.thumbnail((POSE_MAX_SIZE, POSE_MAX_SIZE))
+
+    def encode(img):
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=90)
+        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+
+    return encode(pose), encode(pose.transpose(Image.Transpose.FLIP_LEFT_RIGHT))
+
 
 class ImageObject:
     descriptors: List[str]
@@ -81,8 +104,6 @@ class ImageObject:
         self.negative_prompts = negative_prompts
         self.seed = seed
 
-        self.cache.mkdir(exist_ok=True, parents=True)
-
         if negative_prompts is None:
             negative_prompts = []
         if attack_types is None:
@@ -101,7 +122,9 @@ class ImageObject:
 
 
 class ImageGenerator:
-    def __init__(self):
+    def __init__(self, cache_dir:Path=IMAGE_OUT_DIR, max_parallel:int=SD_MAX_PARALLEL, live_previews:bool=False,
+                 drafts:bool=False, persist:bool=True, local_matte:bool=True, servers:List[str]=SD_SERVERS,
+                 retry_policy:RetryPolicy=None):
 
         self.image_objects: Dict[str, ImageObject] = {}
         self.negative_prompts = [
@@ -127,27 +150,304 @@ class ImageGenerator:
             'plain background',
         ]
 
-        override_settings = {
+        self.override_settings = {
             'override_settings': {
                 'filter_nsfw': True
             },
             'steps': 50
         }
 
-        self.cache = IMAGE_OUT_DIR
+        self.cache = Path(cache_dir)
+        # Each server gets up to ``max_parallel`` jobs; the pool below spreads them out
+        self.scheduler = ImageScheduler(max_parallel * len(servers))
+        self.live_previews = live_previews
+        self.previews: Dict[str, ImageStream] = {}
+        self.previews_lock = threading.Lock()
+        # With drafts, submitted images are made as drafts first and refined once every
+        # waiting job has run
+        self.drafts = drafts
+        self.draft_images = set()
+        # Image name -> (function of draft building its payload, whether to remove the background)
+        self.recipes = {}
+        # Cut portraits out of their plain backdrops here rather than with the server's
+        # /rembg, saving a round trip with the image each way
+        self.local_matte = local_matte
         self.poses = []
 
-        for file in POSE_DIR.glob('*jpg'):
-            self.poses.append(file)
-
+        # This session's logical image names (e.g. 'battle') -> cached file, and the decoded
+        # images, which the scenes turn straight into textures.  With ``persist`` new images
+        # are written to the cache in the background.
+        self.index: Dict[str, Path] = {}
+        self.images: Dict[str, Image.Image] = {}
+        self.persist = persist
+        self.writes: Dict[str, threading.Thread] = {}
+
+        # Shared by every request to the servers, so its counters cover them all
+        self.retry_policy = RetryPolicy() if retry_policy is None else retry_policy
+        self.endpoints = EndpointPool(servers, self.probe, self.retry_policy, max_in_flight=max_parallel)
+        # Servers that have had override_settings applied, each set up by the first job
+        # sent to it if start_up hasn't got to it yet
+        self.configured = set()
+        self.configure_locks = {url: threading.Lock() for url in self.endpoints.urls}
+
+        # Nothing here waits on the disk or the network, so the window can open straight
+        # away; jobs wait for start_up's housekeeping before they run
+        self.ready = threading.Event()
+        threading.Thread(target=self.start_up, daemon=True).start()
+
+    def start_up(self):
+        try:
+            self.cache.mkdir(parents=True, exist_ok=True)
+            self.poses = sorted(POSE_DIR.glob('*jpg'))
+            if not self.poses:
+                print(f"Can't find pose images in {POSE_DIR}")
+            self.evict()
+        finally:
+            self.ready.set()
+
+        for url in self.endpoints.urls:
+            try:
+                self.configure(url)
+            except requests.exceptions.RequestException as e:
+                # The first job sent there will try again
+                print(f'Could not configure diffusion server {url}: {e}')
+
+    def configure(self, url:str):
+        """Apply override_settings on server ``url`` if that hasn't been done yet."""
+        with self.configure_locks[url]:
+            if url not in self.configured:
+                self.send(url, '/sdapi/v1/options', self.override_settings)
+                self.configured.add(url)
+
+    def on_server(self, job):
+        """Run ``job(url)`` on the least loaded server, configuring the server first."""
+        def configured_job(url):
+            self.configure(url)
+            return job(url)
+        return self.endpoints.run(configured_job)
+
+    def close(self):
+        """Stop probing the servers."""
+        self.endpoints.stop()
+
+    def evict(self, max_bytes=IMAGE_CACHE_MAX_BYTES, max_age=IMAGE_CACHE_MAX_AGE):
+        """
+        Delete cached images unused for ``max_age`` seconds, then the least recently used
+        until the cache fits in ``max_bytes``.
+        """
+        files = []
         for file in self.cache.glob('*.png'):
-            file.unlink()
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - max_age
+        for last_used, size, file in sorted(files, key=lambda entry: entry[0]):
+            if last_used >= cutoff and total <= max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            total -= size
+
+    def cached(self, key:str):
+        """Path of the image stored under ``key``, marked as just used, or None."""
+        path = self.cache / f'{key}.png'
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def store(self, key:str, img) -> Path:
+        path = self.cache / f'{key}.png'
+        # Written aside and renamed, so another session never reads a partial file
+        temp = self.cache / f'{key}.{uuid.uuid4().hex}.tmp'
+        img.save(temp, format='PNG')
+        os.replace(temp, path)
+        return path
+
+    @staticmethod
+    def request_key(payload:dict, no_bg:bool=False, local_matte:bool=False) -> str:
+        request = {'payload': payload, 'no_bg': no_bg}
+        if no_bg and local_matte:
+            request['matte'] = 'local'
+        return canonical_hash(request).hex()
+
+    @staticmethod
+    def seed_for(name:str, description:str) -> int:
+        return int.from_bytes(canonical_hash([name, description])[:8], 'big') % SEED_MAX
+
+    def write_back(self, key:str, img) -> Path:
+        """Path image ``key`` is cached at; with ``persist`` it is written there in the background."""
+        path = self.cache / f'{key}.png'
+        if self.persist:
+            writer = threading.Thread(target=self.write, args=(key, img))
+            self.writes[key] = writer
+            writer.start()
+        return path
+
+    def write(self, key:str, img):
+        try:
+            self.store(key, img)
+        except Exception as e:
+            # The session has the image in memory; only later sessions miss out
+            print(f'Failed to write image {key} to the cache: {e}')
+
+    def flush(self):
+        """Wait for images still being written to the cache."""
+        for writer in list(self.writes.values()):
+            writer.join()
+
+    @staticmethod
+    def decode(image:str):
+        img = Image.open(io.BytesIO(base64.b64decode(image.split(",",1)[0])))
+        img.load()
+        return img
 
-        requests.post(url=f"http://{SD_SERVER_IP}:7860/sdapi/v1/options", json=override_settings)
+    @staticmethod
+    def open_image(path):
+        img = Image.open(path)
+        img.load()
+        return img
+
+    def image(self, name:str):
+        """The decoded image ``name``, read from the cache if it was only indexed, or None."""
+        img = self.images.get(name)
+        if img is None and name in self.index:
+            try:
+                img = self.images[name] = self.open_image(self.index[name])
+            except FileNotFoundError:
+                return None
+        return img
+
+    def send(self, url:str, path:str, payload:dict=None):
+        """POST ``payload`` to one server, or GET ``path`` if there's no payload."""
+        timeout = self.retry_policy.timeout(path)
+        if payload is None:
+            request_data = requests.get(url=f'{url}{path}', timeout=timeout)
+        else:
+            request_data = requests.post(url=f'{url}{path}', json=payload, timeout=timeout)
+        request_data.raise_for_status()
+        return request_data.json()
+
+    def post(self, path:str, payload:dict, url:str=None):
+        """POST ``payload`` to server ``url``, or to whichever server is least loaded."""
+        if url is not None:
+            return self.send(url, path, payload)
+        return self.on_server(lambda url: self.send(url, path, payload))
+
+    def probe(self, url:str) -> int:
+        """Number of jobs server ``url`` has queued; raises if it's down."""
+        progress = self.send(url, '/sdapi/v1/progress?skip_current_image=true')
+        return progress['state']['job_count']
+
+    def preview(self, name:str) -> ImageStream:
+        """
+        The ImageStream for image ``name``, which can be picked up before the image is
+        submitted.  With ``live_previews`` it shows the server's previews as it generates;
+        either way it is closed with the final image's path.
+        """
+        with self.previews_lock:
+            if name not in self.previews:
+                self.previews[name] = ImageStream(size=(FINAL_SIZE, FINAL_SIZE))
+            return self.previews[name]
+
+    def schedule(self, name:str, job, priority=0, deadline=None):
+        """
+        Submit ``job``, which makes image ``name`` and returns it, and publish the image to
+        its ImageStream.  If it made a draft, the draft is published as provisional and its
+        refinement is queued behind every job with a deadline.
+        """
+        def publish():
+            stream = self.preview(name)
+            try:
+                img = job()
+            except Exception as e:
+                stream.fail(e)
+                raise
+            if name in self.draft_images:
+                stream.draft(img)
+                self.scheduler.submit(f'{name} (refined)', lambda: self.publish_refined(name), priority=priority)
+            else:
+                stream.close(img)
+            return img
+        return self.scheduler.submit(name, publish, priority=priority, deadline=deadline)
+
+    def publish_refined(self, name:str):
+        stream = self.preview(name)
+        try:
+            # The draft stays up until the final image is done, without previews
+            img = self.render(name, previews=False)
+        except Exception as e:
+            # The draft is good enough to play with
+            print(f'Failed to refine {name}: {e}')
+            img = self.images[name]
+        stream.close(img)
+        return img
 
-    def create_character(self, name:str, description:str, no_bg:bool=False, look_right=False):
+    def submit_character(self, name:str, description:str, no_bg:bool=False, look_right=False,
+                         deadline=None, priority=0):
+        """
+        Queue create_character on the scheduler.  Returns a future for the portrait.
+        """
+        def job():
+            self.create_character(name, description, no_bg=no_bg, look_right=look_right, draft=self.drafts)
+            return self.get_portrait(name, no_bg=no_bg, look_right=look_right)
+        return self.schedule(name, job, priority=priority, deadline=deadline)
+
+    def submit_background(self, name:str, description:str, deadline=None, priority=0):
+        """
+        Queue create_background on the scheduler.  Returns a future for the background.
+        """
+        def job():
+            self.create_background(name, description, draft=self.drafts)
+            return self.get_background(name)
+        return self.schedule(name, job, priority=priority, deadline=deadline)
+
+    def txt2img(self, name:str, payload:dict, previews:bool=True):
+        """
+        Run a txt2img request, publishing the server's live previews to ``name``'s
+        ImageStream while it runs if ``live_previews`` and ``previews`` are set.
+        """
+        if not (self.live_previews and previews):
+            return self.post('/sdapi/v1/txt2img', payload)
+        return self.on_server(lambda url: self.txt2img_with_previews(url, name, payload))
+
+    def txt2img_with_previews(self, url:str, name:str, payload:dict):
+        # Lets the progress endpoint find this job among others running at once
+        task_id = f'task({uuid.uuid4().hex})'
+        stop = threading.Event()
+        poller = threading.Thread(target=self.poll_previews, args=(url, name, task_id, stop), daemon=True)
+        poller.start()
+        try:
+            return self.post('/sdapi/v1/txt2img', dict(payload, force_task_id=task_id), url=url)
+        finally:
+            stop.set()
+            poller.join()
+
+    def poll_previews(self, url:str, name:str, task_id:str, stop:threading.Event):
+        stream = self.preview(name)
+        preview_id = -1
+        while not stop.wait(PREVIEW_INTERVAL):
+            try:
+                progress = self.post('/internal/progress',
+                                     {'id_task': task_id, 'id_live_preview': preview_id, 'live_preview': True},
+                                     url=url)
+                if progress.get('live_preview'):
+                    preview = progress['live_preview'].split(',', 1)[-1]
+                    stream.write(self.decode(preview))
+                    preview_id = progress.get('id_live_preview', preview_id)
+            except Exception as e:
+                # Previews are a nicety; the job itself carries on without them
+                print(f'Stopped polling previews for {name}: {e}')
+                return
+
+    def create_character(self, name:str, description:str, no_bg:bool=False, look_right=False, draft=False):
         descriptors = description.split(',')
-        seed = random.randint(0, SEED_MAX)
+        # Seeded by the request, so a rerun of the same story can come from the cache
+        seed = self.seed_for(name, description)
 
         if name in self.image_objects:
             print('Character already exists. Skipping.')
@@ -158,9 +458,9 @@ class ImageGenerator:
                 seed = seed,
             )
 
-            self.get_portrait(name, no_bg=no_bg, look_right=look_right)
+            self.get_portrait(name, no_bg=no_bg, look_right=look_right, draft=draft)
 
-    def create_background(self, name:str, description:str):
+    def create_background(self, name:str, description:str, draft=False):
         descriptors = description.split(',')
 
         if name in self.image_objects:
@@ -169,21 +469,28 @@ class ImageGenerator:
             self.image_objects[name] = ImageObject(
                 descriptors = descriptors,
                 negative_prompts = self.negative_prompts,
+                seed = self.seed_for(name, description),
             )
 
-            self.get_background(name)
+            self.get_background(name, draft=draft)
 
-    @retry(3, [KeyError, requests.exceptions.ConnectTimeout])
-    def get_background(self, name:str):
+    def get_background(self, name:str, draft=False):
+        """
+        Background ``name``: whatever is already made, or else a new image, which is a
+        draft if ``draft`` is set.
+        """
         if name not in self.image_objects:
             print(f'Background {name} does not exist')
             return
 
-        file_name = self.cache / f'{name}.png'
+        img = self.image(name)
+        if img is not None:
+            return img
 
-        if file_name.exists():
-            return str(file_name)
+        self.recipes[name] = (lambda draft: self.background_payload(name, draft), False)
+        return self.render(name, draft=draft)
 
+    def background_payload(self, name:str, draft=False):
         pos_prompt = ['landscape', 'environment', 'terrain', 'scenery'] + self.image_objects[name].descriptors
         neg_prompt = ['people', 'characters', 'humans', 'crowd', 'person', 'animals', 'figures'] + self.image_objects[name].negative_prompts
 
@@ -193,22 +500,69 @@ class ImageGenerator:
         payload = {
             'prompt': pos_prompt,
             'negative_prompt': neg_prompt,
-            'steps': 50,
+            'steps': FINAL_STEPS,
             'batch_size': 1,
             'denoising_strength': 0.7,
             'hr_upscaler': "Nearest",
             'model': 'DPM++ 2M Kerras'
         }
 
-        request_data = requests.post(url=f"http://{SD_SERVER_IP}:7860/sdapi/v1/txt2img", json=payload)
-        request_data = request_data.json()
-
-        img = request_data['images'][0]
+        if self.image_objects[name].seed is not None:
+            payload['seed'] = self.image_objects[name].seed
 
-        img = Image.open(io.BytesIO(base64.b64decode(img.split(",",1)[0])))
-        img.save(file_name)
+        return self.with_quality(payload, draft)
+
+    @staticmethod
+    def with_quality(payload:dict, draft:bool):
+        if draft:
+            payload.update(steps=DRAFT_STEPS, width=DRAFT_SIZE, height=DRAFT_SIZE)
+        return payload
+
+    def render(self, name:str, draft=False, previews=True):
+        """
+        Make image ``name`` from its recipe, or take it from the cache, and index it.  A
+        draft is only made if the full-quality image isn't cached already.  Live previews
+        are published while it renders unless ``previews`` is off.  Returns the decoded
+        image.
+        """
+        self.ready.wait()
+        make_payload, no_bg = self.recipes[name]
+        payload = make_payload(False)
+        final_key = key = self.request_key(payload, no_bg, self.local_matte)
+        file_name = self.cached(key)
+
+        if file_name is None and draft:
+            payload = make_payload(True)
+            key = self.request_key(payload, no_bg, self.local_matte)
+            file_name = self.cached(key)
+
+        if file_name is None:
+            request_data = self.txt2img(name, payload, previews=previews)
+
+            encoded = request_data['images'][0]
+            # Decoded once here, off the arcade thread, and kept for the scenes
+            img = self.decode(encoded)
+
+            if no_bg:
+                # Runs on the scheduler's thread, not the arcade one, and NumPy releases the
+                # GIL for the array work, so it doesn't hold up the window
+                matted = remove_plain_background(img) if self.local_matte else None
+                if matted is None:
+                    # Not a plain backdrop; the server's model copes with anything
+                    matted = self.decode(self.remove_bg(encoded))
+                img = matted
+
+            file_name = self.write_back(key, img)
+        else:
+            img = self.open_image(file_name)
 
-        return file_name
+        self.images[name] = img
+        self.index[name] = file_name
+        if key == final_key:
+            self.draft_images.discard(name)
+        else:
+            self.draft_images.add(name)
+        return img
 
     def modify_character(self, name, description:str):
         descriptors = description.split(',')
@@ -230,29 +584,29 @@ class ImageGenerator:
             "alpha_matting_erode_size": 10
         }
 
-        request_data = requests.post(url=f"http://{SD_SERVER_IP}:7860/rembg", json=payload)
-        request_data = request_data.json()
+        request_data = self.post('/rembg', payload)
 
         return request_data['image']
 
-    def get_portrait(self, name:str, no_bg:bool=False, look_right=False)->str:
-        file_path = self.cache / f'{name}_portrait.png'
-
-        if not file_path.exists():
-            img = self.create_portrait(name, no_bg=no_bg, look_right=look_right)
-            img.save(str(file_path))
-
-        return str(file_path)
-
-    @retry(3, [KeyError, requests.exceptions.ConnectTimeout])
-    def create_portrait(self, name:str, no_bg:bool=False, look_right=False):
+    def get_portrait(self, name:str, no_bg:bool=False, look_right=False, draft=False):
+        """
+        Character ``name``'s portrait: whatever is already made, or else a new image, which
+        is a draft if ``draft`` is set.
+        """
         if name not in self.image_objects:
             print(f'Character does not exist: {name}')
             return
 
+        img = self.image(name)
+        if img is not None:
+            return img
+
+        self.recipes[name] = (lambda draft: self.portrait_payload(name, look_right, draft), no_bg)
+        return self.render(name, draft=draft)
+
+    def portrait_payload(self, name:str, look_right=False, draft=False):
         pos_prompt = self.image_objects[name].descriptors
-        neg_prompt = self.image_objects[name].negative_prompts
-        neg_prompt += [
+        neg_prompt = self.image_objects[name].negative_prompts + [
             'bad anatomy',
             'amputations',
             'missing head',
@@ -299,18 +653,13 @@ class ImageGenerator:
 
 
         # Seed controlnet
-        pose_file_name = random.choice(self.poses)
-        pose_img = cv2.imread(str(pose_file_name))
-        if look_right:
-            pose_img = cv2.flip(pose_img, 1)
-
-        _, bytes = cv2.imencode('.png', pose_img)
-        pose_img = base64.b64encode(bytes).decode('utf-8')
+        pose_file_name = random.Random(self.image_objects[name].seed).choice(self.poses)
+        pose_img = pose_payloads(pose_file_name)[look_right]
 
         payload = {
             'prompt': pos_prompt,
             'negative_prompt': neg_prompt,
-            'steps': 50,
+            'steps': FINAL_STEPS,
             'restore_faces': True,
             'batch_size': 1,
             'denoising_strength': 0.7,
@@ -331,17 +680,7 @@ class ImageGenerator:
         if self.image_objects[name].seed is not None:
             payload['seed'] = self.image_objects[name].seed
 
-        request_data = requests.post(url=f"http://{SD_SERVER_IP}:7860/sdapi/v1/txt2img", json=payload)
-        request_data = request_data.json()
-
-        img = request_data['images'][0]
-
-        if no_bg:
-            img = self.remove_bg(img)
-
-        img = Image.open(io.BytesIO(base64.b64decode(img.split(",",1)[0])))
-
-        return img
+        return self.with_quality(payload, draft)
 
 if __name__ == '__main__':
     '''
@@ -0,0 +1,247 @@
+import asyncio
+import concurrent.futures
+import dataclasses
+import threading
+import time
+from typing import Callable, Iterable
+
+
+@dataclasses.dataclass
+class Task:
+    """
+    A unit of work in a TaskGraph.  ``reads`` and ``writes`` name the fields the task
+    consumes and produces; the graph derives the dependencies between tasks from them.
+    ``lane`` names the backend the task waits on, for TaskGraph.run to limit separately.
+
+    For TaskGraph.run, ``fn`` can hand its work to another executor and return the
+    concurrent.futures.Future for it; the task then finishes when that future does,
+    without holding one of the graph's workers while it waits.
+    """
+    name: str
+    fn: Callable
+    reads: tuple[str, ...] = ()
+    writes: tuple[str, ...] = ()
+    lane: str | None = None
+
+
+class Milestone(concurrent.futures.Future):
+    """
+    A future that resolves once every named task has finished.  Pass its ``task_done``
+    as the ``on_task_done`` callback of TaskGraph.run, and ``fail`` it if the run raises.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        super().__init__()
+        self.pending = set(names)
+        self.lock = threading.Lock()
+        if not self.pending:
+            self.set_result(None)
+
+    def task_done(self, name: str):
+        with self.lock:
+            self.pending.discard(name)
+            if not self.pending and not self.done():
+                self.set_result(None)
+
+    def fail(self, error: BaseException):
+        with self.lock:
+            if not self.done():
+                self.set_exception(error)
+
+
+class TaskGraph:
+    """
+    Runs a set of tasks in dependency order with bounded parallelism.  A task is started
+    as soon as every field it reads has been written by another task in the graph, or is
+    listed in ``available``.
+    """
+
+    def __init__(self, tasks: Iterable[Task], available: Iterable[str] = ()):
+        self.tasks = {task.name: task for task in tasks}
+        self.available = set(available)
+
+        self.writers = {}
+        for task in self.tasks.values():
+            for field in task.writes:
+                if field in self.writers:
+                    raise ValueError(f'Field {field} is written by both {self.writers[field]} and {task.name}')
+                self.writers[field] = task.name
+
+        self.dependencies = {}
+        for task in self.tasks.values():
+            dependencies = set()
+            for field in task.reads:
+                if field in self.writers:
+                    dependencies.add(self.writers[field])
+                elif field not in self.available:
+                    raise ValueError(f'Task {task.name} reads {field}, which no task writes')
+            self.dependencies[task.name] = dependencies
+
+        self.check_acyclic()
+        # Task name -> (start, end) from time.perf_counter, filled in as tasks finish
+        self.timings = {}
+
+    @classmethod
+    def for_targets(cls, tasks: Iterable[Task], targets: Iterable[str], available: Iterable[str] = ()):
+        """
+        Build a graph holding only the tasks needed to produce ``targets``.  Tasks whose
+        outputs are all in ``available`` already are left out.
+        """
+        available = set(available)
+        writers = {}
+        for task in tasks:
+            if not set(task.writes) <= available:
+                for field in task.writes:
+                    writers[field] = task
+
+        needed = {}
+        stack = [field for field in targets if field not in available]
+        while stack:
+            field = stack.pop()
+            if field not in writers:
+                raise ValueError(f'Nothing writes {field}')
+            task = writers[field]
+            if task.name not in needed:
+                needed[task.name] = task
+                stack.extend(f for f in task.reads if f not in available)
+
+        return cls([task for task in tasks if task.name in needed], available)
+
+    def check_acyclic(self):
+        visiting, visited = set(), set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f'Dependency cycle through task {name}')
+            visiting.add(name)
+            for dependency in self.dependencies[name]:
+                visit(dependency)
+            visiting.remove(name)
+            visited.add(name)
+
+        for name in self.tasks:
+            visit(name)
+
+    def run(self, max_workers: int = 4, on_task_done: Callable | None = None, priority: Callable | None = None,
+            lanes: dict[str, int] | None = None):
+        """
+        Execute the graph, running at most ``max_workers`` tasks at a time, and at most
+        ``lanes[lane]`` of the tasks in each listed lane.  The first exception raised by a
+        task stops any further tasks from starting and is re-raised once the running ones
+        have returned.  ``on_task_done`` is called with the name of each task that
+        finishes successfully.  When more tasks are ready than there are free workers,
+        those with the lowest ``priority(name)`` start first.  A task that returned a
+        future keeps its place in its lane, but not a worker, until the future is done.
+        """
+        remaining = {name: set(dependencies) for name, dependencies in self.dependencies.items()}
+        running = {}
+        # Futures returned by tasks -> task name
+        deferred = {}
+        if lanes is None:
+            lanes = {}
+        lane_load = {lane: 0 for lane in lanes}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while remaining or running or deferred:
+                ready = [name for name, dependencies in remaining.items() if not dependencies]
+                if priority is not None:
+                    ready.sort(key=priority)
+                for name in ready:
+                    if len(running) == max_workers:
+                        break
+                    lane = self.tasks[name].lane
+                    if lane in lanes:
+                        if lane_load[lane] == lanes[lane]:
+                            continue
+                        lane_load[lane] += 1
+                    del remaining[name]
+                    running[executor.submit(self.run_task, name)] = name
+
+                finished, _ = concurrent.futures.wait([*running, *deferred],
+                                                      return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    if future in deferred:
+                        name = deferred.pop(future)
+                        self.timings[name] = (self.timings[name][0], time.perf_counter())
+                    else:
+                        name = running.pop(future)
+                        if future.exception() is None and isinstance(future.result(), concurrent.futures.Future):
+                            deferred[future.result()] = name
+                            continue
+                    if self.tasks[name].lane in lane_load:
+                        lane_load[self.tasks[name].lane] -= 1
+                    if future.exception() is not None:
+                        remaining.clear()
+                        concurrent.futures.wait(running)
+                        raise future.exception()
+                    for dependencies in remaining.values():
+                        dependencies.discard(name)
+                    if on_task_done is not None:
+                        on_task_done(name)
+
+    def run_task(self, name):
+        start = time.perf_counter()
+        try:
+            return self.tasks[name].fn()
+        finally:
+            self.timings[name] = (start, time.perf_counter())
+
+    async def arun(self, max_concurrency: int = 4, on_task_done: Callable | None = None):
+        """
+        Execute a graph of coroutine functions on the running event loop, with at most
+        ``max_concurrency`` of them awaiting at a time.  Errors are handled as in ``run``.
+        """
+        remaining = {name: set(dependencies) for name, dependencies in self.dependencies.items()}
+        running = {}
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_task(name):
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    await self.tasks[name].fn()
+                finally:
+                    self.timings[name] = (start, time.perf_counter())
+
+        while remaining or running:
+            ready = [name for name, dependencies in remaining.items() if not dependencies]
+            for name in ready:
+                del remaining[name]
+                running[asyncio.ensure_future(run_task(name))] = name
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                if future.exception() is not None:
+                    remaining.clear()
+                    if running:
+                        await asyncio.wait(running)
+                    raise future.exception()
+                for dependencies in remaining.values():
+                    dependencies.discard(name)
+                if on_task_done is not None:
+                    on_task_done(name)
+
+
+def critical_path(graphs: Iterable[TaskGraph], name: str):
+    """
+    Walk back from task ``name`` through whichever of its dependencies finished last,
+    across TaskGraphs that have already run (a later graph's available fields are usually
+    written by an earlier one).  Returns ``(task name, start, end)`` tuples in run order.
+    """
+    timings, reads, writers = {}, {}, {}
+    for graph in graphs:
+        timings.update(graph.timings)
+        for task in graph.tasks.values():
+            reads[task.name] = task.reads
+            for field in task.writes:
+                writers[field] = task.name
+
+    path = []
+    while name is not None:
+        path.append((name, *timings[name]))
+        dependencies = [writers[field] for field in reads[name] if writers.get(field) in timings]
+        name = max(dependencies, key=lambda dependency: timings[dependency][1], default=None)
+    return path[::-1]
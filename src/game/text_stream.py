@@ -0,0 +1,41 @@
+import threading
+
+
+class TextStream:
+    """
+    Text that grows while a completion streams in.  One thread writes tokens and closes
+    the stream; any number of readers (e.g. a DialogBox on the arcade thread) look at
+    ``text`` as it grows without owning it.
+    """
+
+    def __init__(self):
+        self.text = ''
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def write(self, token):
+        with self.condition:
+            self.text += token
+            self.condition.notify_all()
+
+    def close(self):
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    def fail(self, error):
+        with self.condition:
+            self.error = error
+            self.done = True
+            self.condition.notify_all()
+
+    def wait(self, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.done, timeout)
+        if self.error is not None:
+            raise self.error
+        return self.text
+
+    def __len__(self):
+        return len(self.text)
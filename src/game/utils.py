@@ -1,44 +1,107 @@
-import os
+import asyncio
+import collections
+import inspect
+import json
 import pickle
+import threading
 from functools import wraps
 import hashlib
 
-def persistent_cache(cache_file):
+from .cache_store import MISSING, SQLiteStore
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses'])
+
+
+def canonical_hash(value):
+    """
+    Hash a JSON-compatible value (e.g. a list of chat messages) so that equal values
+    always give the same digest, independent of dict ordering or the pickle protocol.
+    """
+    text = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def persistent_cache(cache_file, max_entries=None, store=None, key=None):
     """
     Function to implement a persistent cache. It decorates a function with caching logic,
     storing results of function calls in a file to avoid duplicate computations.
 
+    Every function decorated by the same decorator shares one cache, so a blocking
+    function and its coroutine twin hit on each other's results.
+
     Parameters:
     cache_file (str): The path to the cache file.
+    max_entries (int): Evict the least recently used entries beyond this many.
+    store: Storage backend with ``get(key, default)`` and ``put(key, value)``.  Defaults
+        to a SQLiteStore on ``cache_file``.
+    key (function): Called with the decorated function's arguments, returns the
+        JSON-compatible value that identifies the call, e.g. ``lambda self, payload:
+        (self.MODEL, payload)``.  Without it every argument is pickled into the key.
 
     Returns:
     decorator (function): The wrapper function.
     """
 
-    def decorator(func):
-        cache = {}
+    if store is None:
+        store = SQLiteStore(cache_file, max_entries=max_entries)
 
-        if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as f:
-                cache = pickle.load(f)
+    counts = {'hits': 0, 'misses': 0}
+    counts_lock = threading.Lock()
 
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            # args = args[1:]
+    def count(result):
+        with counts_lock:
+            counts[result] += 1
+
+    def cache_info():
+        return CacheInfo(counts['hits'], counts['misses'])
+
+    def make_key(args, kwargs):
+        if key is not None:
+            return canonical_hash(key(*args, **kwargs))
+
+        key_data = (args, tuple(kwargs.items()))
+
+        byte_data = pickle.dumps(key_data)
+        hasher = hashlib.sha256()
+        hasher.update(byte_data)
 
-            key = (args, tuple(kwargs.items()))
+        return hasher.digest()
 
-            byte_data = pickle.dumps(key)
-            hasher = hashlib.sha256()
-            hasher.update(byte_data)
+    # Read the store off the decorator at call time so it can be swapped out later
+    def lookup(args, kwargs):
+        value = decorator.store.get(make_key(args, kwargs))
+        count('misses' if value is MISSING else 'hits')
+        return value
 
-            key = hasher.digest()
+    def remember(args, kwargs, value):
+        decorator.store.put(make_key(args, kwargs), value)
 
-            if key not in cache:
-                cache[key] = func(*args, **kwargs)
-                with open(cache_file, 'wb') as f:
-                    pickle.dump(cache, f)
-            return cache[key]
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                # The store blocks on SQLite, which mustn't hold up the event loop
+                value = await asyncio.to_thread(lookup, args, kwargs)
+                if value is MISSING:
+                    value = await func(*args, **kwargs)
+                    await asyncio.to_thread(remember, args, kwargs, value)
+                return value
+            async_wrapper.cache_info = cache_info
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            value = lookup(args, kwargs)
+            if value is MISSING:
+                value = func(*args, **kwargs)
+                remember(args, kwargs, value)
+            return value
+        wrapper.cache_info = cache_info
         return wrapper
 
+    # For callers that produce the value some other way, e.g. by streaming it
+    decorator.lookup = lookup
+    decorator.remember = remember
+    decorator.store = store
+    decorator.cache_info = cache_info
     return decorator
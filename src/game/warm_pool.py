@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+'''
+Pool of pre-generated games, so a player whose story matches one can start without
+waiting on the full generation.  Fill it with:
+
+    python -m game.warm_pool --dir warm_pool --traits Fantasy:Whimsical --traits Horror:Gothic
+
+and point the game at the same directory with GAMEGEN_WARM_POOL.  Traits that players
+ask for and miss are added to the pool's wanted list, so a running producer follows
+demand.
+'''
+import argparse
+import dataclasses
+import json
+import random
+import re
+import shutil
+import threading
+import uuid
+from pathlib import Path
+
+from .chatbot import ACTION_FIELDS, StoryTeller
+from .combat import Action
+from .generation import PERSONAL_FIELDS, image_tasks
+from .stable_diffusion import ImageGenerator, ImageObject
+
+WARM_POOL_DIR = Path('warm_pool')
+ENTRIES_PER_KEY = 2
+MAX_ENTRIES = 16
+POLL_INTERVAL = 30.
+
+# Pooled stories are written for a stand-in hero, renamed to the player when taken.  A
+# different name each time keeps the story cache from handing every entry the same story.
+FIRST_NAMES = ['Rowan', 'Talia', 'Corvin', 'Isolde', 'Bram', 'Maren', 'Oskar', 'Wren']
+LAST_NAMES = ['Ashby', 'Thorne', 'Calloway', 'Drummond', 'Vance', 'Hollis', 'Marchetti', 'Quill']
+PLACEHOLDER_JOB = 'wandering adventurer'
+
+
+def first_word(text):
+    words = re.findall(r'[a-z]+', (text or '').lower())
+    return words[0] if words else 'any'
+
+
+def pool_key(genre, tone):
+    """
+    Coarse key for matching stories: the first word of the genre and of the artistic
+    tone, e.g. ``fantasy-whimsical``.
+    """
+    return f'{first_word(genre)}-{first_word(tone)}'
+
+
+class WarmPool:
+    """
+    Pre-generated games on disk, one directory per pool_key holding one directory per
+    game.  A game has its story fields, minus the dialogue, and the cache keys of its
+    images in ``story.json``.  Games are built under ``.building`` and claimed by
+    renaming them into ``.claimed``, so several game processes and producers can share
+    one pool.
+    """
+
+    def __init__(self, directory=WARM_POOL_DIR, entries_per_key=ENTRIES_PER_KEY, max_entries=MAX_ENTRIES,
+                 story_teller_factory=None, image_generator_factory=ImageGenerator):
+        self.directory = Path(directory)
+        self.entries_per_key = entries_per_key
+        self.max_entries = max_entries
+        if story_teller_factory is None:
+            story_teller_factory = lambda: StoryTeller(use_chatgpt=True, bundled=True)
+        self.story_teller_factory = story_teller_factory
+        self.image_generator_factory = image_generator_factory
+
+        self.building = self.directory / '.building'
+        self.claimed = self.directory / '.claimed'
+        self.building.mkdir(parents=True, exist_ok=True)
+        self.claimed.mkdir(parents=True, exist_ok=True)
+
+        self.stopping = threading.Event()
+        self.producer = None
+
+    def keys(self):
+        return sorted(path.parent.name for path in self.directory.glob('*/traits.json'))
+
+    def entries(self, key):
+        return sorted(path.parent for path in (self.directory / key).glob('*/story.json'))
+
+    def want(self, genre, tone):
+        """Add a genre and tone to the traits the producer keeps games ready for."""
+        key_dir = self.directory / pool_key(genre, tone)
+        if not (key_dir / 'traits.json').exists():
+            key_dir.mkdir(exist_ok=True)
+            with open(key_dir / 'traits.json', 'w') as f:
+                json.dump({'genre': genre, 'tone': tone}, f)
+
+    def take(self, story_teller, image_generator):
+        """
+        Fill ``story_teller`` and ``image_generator`` from a pooled game with the same
+        pool_key as the story teller's genre and tone, personalised with the player's
+        name.  Returns whether there was one; a game that fails to load is thrown away.
+        """
+        key = pool_key(story_teller.genre, story_teller.tone)
+        for entry in self.entries(key):
+            claimed = self.claimed / entry.name
+            try:
+                entry.rename(claimed)
+            except FileNotFoundError:
+                # Another game got to it first
+                continue
+            try:
+                self.load(claimed, story_teller, image_generator)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                # Corrupt, half-written, or its images have left the cache
+                print(f'warm pool: discarding {key} game {entry.name}: {e!r}')
+                continue
+            finally:
+                shutil.rmtree(claimed, ignore_errors=True)
+            return True
+
+        self.want(story_teller.genre, story_teller.tone)
+        return False
+
+    @staticmethod
+    def load(entry, story_teller, image_generator):
+        with open(entry / 'story.json') as f:
+            saved = json.load(f)
+
+        placeholder = saved['player_name']
+        player_name = story_teller.player_name
+
+        def personalise(value):
+            if not isinstance(value, str):
+                return value
+            value = value.replace(placeholder, player_name)
+            # The model often shortens the hero to their first name
+            return re.sub(rf'\b{re.escape(placeholder.split()[0])}\b', lambda _: player_name, value)
+
+        fields = {}
+        for field, value in saved['fields'].items():
+            if field in ACTION_FIELDS:
+                value = [Action(**action) for action in value]
+            fields[field] = personalise(value)
+
+        # The images themselves are in the shared image cache; a game just records their keys
+        image_objects, index = {}, {}
+        for name, image in saved['images'].items():
+            new_name = player_name if name == placeholder else name
+            image_objects[new_name] = ImageObject(
+                descriptors=[personalise(descriptor) for descriptor in image['descriptors']],
+                negative_prompts=image_generator.negative_prompts,
+                seed=image['seed'],
+            )
+            if image['key'] is not None:
+                path = image_generator.cache / f'{image["key"]}.png'
+                if not path.exists():
+                    raise FileNotFoundError(f'{name} is no longer in the image cache: {path}')
+                index[new_name] = path
+
+        # Only touched once the whole game has loaded, so a bad one leaves them as they were
+        for field, value in fields.items():
+            setattr(story_teller, field, value)
+        image_generator.image_objects.update(image_objects)
+        image_generator.index.update(index)
+
+    def next_key(self):
+        """The wanted key with the fewest games, or None if the pool is full."""
+        counts = {key: len(self.entries(key)) for key in self.keys()}
+        if sum(counts.values()) >= self.max_entries:
+            return None
+        wanting = [key for key, count in counts.items() if count < self.entries_per_key]
+        return min(wanting, key=lambda key: counts[key], default=None)
+
+    def produce(self, key):
+        """Generate one game for ``key`` and add it to the pool."""
+        with open(self.directory / key / 'traits.json') as f:
+            traits = json.load(f)
+
+        entry_id = uuid.uuid4().hex
+        building = self.building / entry_id
+        placeholder = f'{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}'
+
+        story_teller = self.story_teller_factory()
+        story_teller.add_basic_character_info(placeholder, PLACEHOLDER_JOB, '')
+        story_teller.genre = traits['genre']
+        story_teller.tone = traits['tone']
+        image_generator = self.image_generator_factory()
+        building.mkdir()
+
+        fields = [field for field in story_teller.story_fields() if field not in PERSONAL_FIELDS]
+        print(f'warm pool: generating a {key} game')
+        try:
+            story_teller.generate(targets=fields,
+                                  extra_tasks=list(image_tasks(story_teller, image_generator).values()))
+            # The game only records the images' keys, so they have to be in the cache first
+            image_generator.flush()
+
+            with open(building / 'story.json', 'w') as f:
+                json.dump({
+                    'player_name': placeholder,
+                    'fields': {field: getattr(story_teller, field) for field in fields},
+                    'images': {name: {'descriptors': image_object.descriptors,
+                                      'seed': image_object.seed,
+                                      'key': image_generator.index[name].stem if name in image_generator.index else None}
+                               for name, image_object in image_generator.image_objects.items()},
+                }, f, default=dataclasses.asdict)
+            building.rename(self.directory / key / entry_id)
+        except Exception:
+            shutil.rmtree(building, ignore_errors=True)
+            raise
+        finally:
+            image_generator.close()
+
+    def run(self):
+        """Keep the pool filled until stop() is called."""
+        while not self.stopping.is_set():
+            key = self.next_key()
+            if key is None:
+                self.stopping.wait(POLL_INTERVAL)
+                continue
+            try:
+                self.produce(key)
+            except Exception as e:
+                print(f'warm pool: failed to generate a {key} game: {e}')
+                self.stopping.wait(POLL_INTERVAL)
+
+    def start(self):
+        self.stopping.clear()
+        self.producer = threading.Thread(target=self.run, daemon=True)
+        self.producer.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.producer is not None:
+            self.producer.join()
+            self.producer = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep a pool of pre-generated games filled.')
+    parser.add_argument('--dir', default=str(WARM_POOL_DIR))
+    parser.add_argument('--traits', action='append', default=[], metavar='GENRE:TONE',
+                        help='Genre and tone to keep games ready for; may be repeated.')
+    parser.add_argument('--entries-per-key', type=int, default=ENTRIES_PER_KEY)
+    parser.add_argument('--max-entries', type=int, default=MAX_ENTRIES)
+    args = parser.parse_args()
+
+    pool = WarmPool(args.dir, entries_per_key=args.entries_per_key, max_entries=args.max_entries)
+    for traits in args.traits:
+        genre, _, tone = traits.partition(':')
+        pool.want(genre, tone)
+
+    try:
+        pool.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
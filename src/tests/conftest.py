@@ -0,0 +1,10 @@
+import pytest
+
+from game import chatbot
+from game.cache_store import MemoryStore
+
+
+@pytest.fixture(autouse=True)
+def story_cache(monkeypatch):
+    # Keep completions out of the on-disk story cache and each test's out of the others'
+    monkeypatch.setattr(chatbot.story_cache, 'store', MemoryStore())
@@ -0,0 +1,47 @@
+import pytest
+
+from game.asset_store import AssetStore
+
+
+def test_futures_exist_before_the_asset_does():
+    assets = AssetStore()
+    future = assets.future('title')
+    assert not assets.done('title')
+    assets.put('title', 'The Legend of Fife')
+    assert future.result(timeout=0) == 'The Legend of Fife'
+    # Only the first value counts
+    assets.put('title', 'Another')
+    assert assets.future('title').result(timeout=0) == 'The Legend of Fife'
+
+
+def test_on_ready_calls_back_now_or_later():
+    assets = AssetStore()
+    seen = []
+    assets.on_ready('battle background', lambda future: seen.append(future.result()))
+    assert seen == []
+    assets.put('battle background', 'image')
+    assets.on_ready('battle background', lambda future: seen.append(future.result()))
+    assert seen == ['image', 'image']
+
+
+def test_ready_waits_for_every_name():
+    assets = AssetStore()
+    ready = assets.ready(['title', 'title background'])
+    assets.put('title', 'The Legend of Fife')
+    assert not ready.done()
+    assets.put('title background', 'image')
+    assert ready.result(timeout=0) is None
+    assert assets.ready([]).done()
+
+
+def test_fail_reaches_waiting_and_later_futures():
+    assets = AssetStore()
+    assets.put('title', 'The Legend of Fife')
+    waiting = assets.future('prologue')
+    ready = assets.ready(['title', 'prologue'])
+    assets.fail(RuntimeError('backend down'))
+
+    assert assets.future('title').result(timeout=0) == 'The Legend of Fife'
+    for future in (waiting, ready, assets.future('battle background'), assets.ready(['hero portrait'])):
+        with pytest.raises(RuntimeError, match='backend down'):
+            future.result(timeout=0)
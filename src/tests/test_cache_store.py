@@ -0,0 +1,70 @@
+import asyncio
+import threading
+
+import pytest
+
+from game.cache_store import MISSING, MemoryStore, SQLiteStore
+from game.utils import persistent_cache
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryStore(max_entries=2)
+    return SQLiteStore(tmp_path / 'cache.sqlite', max_entries=2)
+
+
+def test_get_and_put(store):
+    assert store.get(b'a') is MISSING
+    assert store.get(b'a', None) is None
+    store.put(b'a', {'value': [1, 2]})
+    assert store.get(b'a') == {'value': [1, 2]}
+
+
+def test_evicts_least_recently_used(store):
+    store.put(b'a', 1)
+    store.put(b'b', 2)
+    # Reading a makes b the least recently used
+    assert store.get(b'a') == 1
+    store.put(b'c', 3)
+    assert store.get(b'b') is MISSING
+    assert store.get(b'a') == 1
+    assert store.get(b'c') == 3
+    assert len(store) == 2
+
+
+def test_sqlite_store_persists(tmp_path):
+    SQLiteStore(tmp_path / 'cache.sqlite').put(b'a', 'kept')
+    assert SQLiteStore(tmp_path / 'cache.sqlite').get(b'a') == 'kept'
+
+
+def test_sqlite_store_is_shared_across_threads(tmp_path):
+    store = SQLiteStore(tmp_path / 'cache.sqlite')
+    threads = [threading.Thread(target=store.put, args=(bytes([i]), i)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [store.get(bytes([i])) for i in range(8)] == list(range(8))
+
+
+def test_persistent_cache_shares_results_between_blocking_and_async():
+    cache = persistent_cache(None, store=MemoryStore(), key=lambda value: value)
+    calls = []
+
+    @cache
+    def double(value):
+        calls.append(value)
+        return value * 2
+
+    @cache
+    async def adouble(value):
+        calls.append(value)
+        return value * 2
+
+    assert double(2) == 4
+    assert asyncio.run(adouble(2)) == 4
+    assert asyncio.run(adouble(3)) == 6
+    assert double(3) == 6
+    assert calls == [2, 3]
+    assert cache.cache_info() == (2, 2)
@@ -0,0 +1,84 @@
+import json
+
+from game.chatbot import StoryTeller, parse_bundle
+from game.combat import DEFAULT_ATTACKS, parse_actions
+
+ATTACKS = [{'name': f'Attack {i}', 'damage': 100, 'accuracy': 85, 'description': 'Hits'} for i in range(4)]
+ITEMS = [{'name': 'Potion', 'damage': -120, 'description': 'Heals'},
+         {'name': 'Bomb', 'damage': 200, 'description': 'Explodes'}]
+
+
+class ScriptedBackend:
+    """Answers each chat request with the next of ``responses``, keeping the payloads."""
+
+    cache_id = 'scripted'
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.payloads = []
+
+    def complete(self, model, payload):
+        self.payloads.append(payload)
+        return self.responses.pop(0)
+
+
+def story_teller(responses):
+    teller = StoryTeller(use_chatgpt=False, backend=ScriptedBackend(responses), bundled=True)
+    teller.add_basic_character_info('Angus McFife', 'hammer-wielding prince', '')
+    teller.main_character_description = 'A prince of Fife.'
+    return teller
+
+
+def test_parse_bundle_keeps_the_fields_that_validate():
+    response = 'Sure: ' + json.dumps({'prompt': ['red cloak'], 'attacks': ATTACKS[:2]})
+    fields = parse_bundle(response, {
+        'prompt': lambda value: value,
+        'attacks': lambda value: parse_actions(value, 4, with_accuracy=True),
+        'inventory': lambda value: value,
+    })
+    assert fields == {'prompt': ['red cloak']}
+    assert parse_bundle('not json {', {'prompt': lambda value: value}) == {}
+    assert parse_bundle('[1, 2]', {'prompt': lambda value: value}) == {}
+
+
+def test_bundled_story_schedules_the_bundle_steps():
+    bundled = story_teller([]).story_graph()
+    assert 'create_main_character_bundle' in bundled.tasks
+    assert 'create_main_character_attacks' not in bundled.tasks
+
+    teller = StoryTeller(use_chatgpt=False)
+    teller.add_basic_character_info('Angus McFife', 'hammer-wielding prince', '')
+    assert 'create_main_character_attacks' in teller.story_graph().tasks
+
+
+def test_bundle_sets_every_field_from_one_request():
+    bundle = json.dumps({'prompt': ['red cloak', 'iron hammer'], 'attacks': ATTACKS, 'inventory': ITEMS})
+    teller = story_teller([bundle])
+    teller.create_main_character_bundle()
+
+    assert teller.main_character_prompt == 'red cloak\niron hammer'
+    assert len(teller.main_character_attacks) == 4
+    assert len(teller.main_character_inventory) == 2
+    assert len(teller.backend.payloads) == 1
+
+
+def test_bundle_repairs_only_the_invalid_fields():
+    bundle = json.dumps({'prompt': ['red cloak', 'iron hammer'], 'attacks': 'lots of them', 'inventory': ITEMS})
+    teller = story_teller([bundle, json.dumps(ATTACKS)])
+    teller.create_main_character_bundle()
+
+    assert teller.main_character_prompt == 'red cloak\niron hammer'
+    assert [action.name for action in teller.main_character_attacks] == [f'Attack {i}' for i in range(4)]
+    assert [action.name for action in teller.main_character_inventory] == ['Potion', 'Bomb']
+    # The bundle, then the attacks on their own
+    payloads = teller.backend.payloads
+    assert len(payloads) == 2
+    assert 'list of four attacks' in payloads[1][-1]['content']
+
+
+def test_bundle_repair_uses_defaults_when_asking_again_fails():
+    teller = story_teller(['{}', 'red cloak, iron hammer', 'bad', 'worse', json.dumps(ITEMS)])
+    teller.create_main_character_bundle()
+
+    assert teller.main_character_attacks == DEFAULT_ATTACKS
+    assert [action.name for action in teller.main_character_inventory] == ['Potion', 'Bomb']
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from game.chatbot import StoryTeller
+from game.combat import DEFAULT_ITEMS, Action, parse_actions, to_int
+
+ATTACKS = [{'name': f'Attack {i}', 'damage': 100, 'accuracy': '85%', 'description': 'Hits'} for i in range(4)]
+ITEMS = [{'name': 'Potion', 'damage': '-120 HP', 'description': 'Heals'},
+         {'name': 'Bomb', 'damage': 200, 'description': 'Explodes'}]
+
+
+def story_teller():
+    teller = StoryTeller(use_chatgpt=False)
+    teller.add_basic_character_info('Angus McFife', 'hammer-wielding prince', '')
+    return teller
+
+
+def test_to_int():
+    assert to_int('85%') == 85
+    assert to_int('-120 HP') == -120
+    assert to_int(3.7) == 3
+    for value in (True, 'lots'):
+        with pytest.raises(ValueError):
+            to_int(value)
+
+
+def test_parse_actions_drops_prose_and_extras():
+    response = 'Here you go!\n' + json.dumps(ATTACKS + ATTACKS[:1]) + '\nEnjoy.'
+    actions = parse_actions(response, 4, with_accuracy=True)
+    assert actions == [Action(f'Attack {i}', 100, 'Hits', 85) for i in range(4)]
+
+    items = parse_actions(ITEMS, 2, with_accuracy=False)
+    assert items[0].heals and items[0].accuracy == 100
+
+
+@pytest.mark.parametrize('response, message', [
+    ('no list here', 'expected a JSON list'),
+    ('[{"name": "Oops",]', 'invalid JSON'),
+    (json.dumps(ATTACKS[:3]), 'expected a list of 4'),
+    (json.dumps([{'name': 'Strike', 'damage': 10}] * 4), 'missing accuracy'),
+])
+def test_parse_actions_errors(response, message):
+    with pytest.raises(ValueError, match=message):
+        parse_actions(response, 4, with_accuracy=True)
+
+
+def test_ask_for_actions_reasks_with_the_error():
+    teller = story_teller()
+    payload = [{'role': 'user', 'content': 'attacks please'}]
+    step = teller.ask_for_actions(payload, 4, with_accuracy=True)
+
+    assert next(step) == payload
+    reask = step.send('I cannot do that.')
+    assert reask[:1] == payload
+    assert reask[1] == {'role': 'assistant', 'content': 'I cannot do that.'}
+    assert 'expected a JSON list' in reask[2]['content']
+
+    with pytest.raises(StopIteration) as stop:
+        step.send(json.dumps(ATTACKS))
+    assert [action.name for action in stop.value.value] == [f'Attack {i}' for i in range(4)]
+
+
+def test_ask_for_actions_falls_back_to_defaults():
+    teller = story_teller()
+    step = teller.ask_for_actions([], 2, with_accuracy=False)
+    next(step)
+    step.send('nope')
+    with pytest.raises(StopIteration) as stop:
+        step.send('still nope')
+    assert stop.value.value == DEFAULT_ITEMS[:2]
@@ -0,0 +1,34 @@
+from game.dialogue import DialogueParser
+
+
+def test_multi_line_dialogue():
+    parser = DialogueParser()
+    lines = parser.feed('Angus: You will fall.\nZargothrax: Many have said so.\nAngus: Then')
+    assert lines == [('Angus', 'Angus: You will fall.'), ('Zargothrax', 'Zargothrax: Many have said so.')]
+    # The last line only counts once the dialogue has ended
+    assert parser.feed(' I will be the last.') == []
+    assert parser.finish() == [('Angus', 'Angus: Then I will be the last.')]
+    assert parser.finish() == []
+
+
+def test_lines_split_across_tokens():
+    parser = DialogueParser()
+    lines = []
+    for token in ['Ang', 'us: Hi', 'ya.\n', '\n', 'Zarg', 'othrax: ', 'Begone.']:
+        lines += parser.feed(token)
+    lines += parser.finish()
+    assert lines == [('Angus', 'Angus: Hiya.'), ('Zargothrax', 'Zargothrax: Begone.')]
+
+
+def test_lines_without_a_speaker_are_skipped():
+    parser = DialogueParser()
+    lines = parser.feed('Here is the dialogue:\n  Angus: Ready?  \nThey fight.\nTime:12\n')
+    assert lines == [('Angus', 'Angus: Ready?')]
+    assert parser.finish() == []
+
+
+def test_empty_input():
+    parser = DialogueParser()
+    assert parser.feed('') == []
+    assert parser.feed('\n\n') == []
+    assert parser.finish() == []
@@ -0,0 +1,176 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from game.endpoint_pool import FULL, EndpointPool
+from game.retry_policy import RetryPolicy
+
+
+def make_pool(urls=('http://a', 'http://b'), **kwargs):
+    # No backoff, and no prober thread racing the tests' health settings
+    kwargs.setdefault('policy', RetryPolicy(base_delay=0.))
+    pool = EndpointPool(list(urls), probe=lambda url: 0, interval=3600., **kwargs)
+    pool.stop()
+    return pool
+
+
+def test_choose_skips_unhealthy_servers_before_the_limit():
+    pool = make_pool(max_in_flight=1)
+    a, b = pool.endpoints
+    a.healthy = False
+    b.in_flight = 1
+    assert pool.choose() is FULL
+    b.in_flight = 0
+    assert pool.choose() is b
+
+
+def test_every_server_down_still_gets_tried():
+    pool = make_pool(max_in_flight=1)
+    for endpoint in pool.endpoints:
+        endpoint.healthy = False
+    assert pool.choose() is not None
+
+
+def test_jobs_wait_for_a_free_slot():
+    pool = make_pool(urls=['http://a'], max_in_flight=2)
+    lock = threading.Lock()
+    load = [0]
+    peak = [0]
+
+    def job(url):
+        with lock:
+            load[0] += 1
+            peak[0] = max(peak[0], load[0])
+        time.sleep(.05)
+        with lock:
+            load[0] -= 1
+        return url
+
+    threads = [threading.Thread(target=pool.run, args=(job,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+    assert pool.endpoints[0].in_flight == 0
+
+
+def test_open_breakers_fail_instead_of_waiting():
+    pool = make_pool(max_in_flight=1)
+    for endpoint in pool.endpoints:
+        endpoint.breaker.opened_at = time.monotonic()
+
+    def job(url):
+        pytest.fail('sent to a server whose breaker is open')
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.run(job)
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+def test_choose_least_loaded():
+    pool = make_pool(urls=['http://a', 'http://b', 'http://c'])
+    a, b, c = pool.endpoints
+    a.in_flight, b.queued, c.in_flight = 2, 1, 3
+    assert pool.choose() is b
+    assert pool.choose(avoid=[b]) is a
+
+
+def test_failed_job_moves_to_another_server():
+    pool = make_pool()
+    sent = []
+
+    def job(url):
+        sent.append(url)
+        if url == 'http://a':
+            raise requests.exceptions.ConnectionError('refused')
+        return 'image'
+
+    assert pool.run(job) == 'image'
+    assert sent == ['http://a', 'http://b']
+    a, b = pool.endpoints
+    assert not a.healthy and b.healthy
+    assert a.in_flight == b.in_flight == 0
+    assert a.breaker.failures == 1 and b.breaker.failures == 0
+    assert pool.policy.stats()['failovers'] == 1
+
+
+def test_gives_up_after_the_policy_attempts():
+    pool = make_pool(urls=['http://a'])
+    sent = []
+
+    def job(url):
+        sent.append(url)
+        raise requests.exceptions.ReadTimeout('slow')
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        pool.run(job)
+    assert len(sent) == pool.policy.attempts
+    assert pool.endpoints[0].in_flight == 0
+    stats = pool.policy.stats()
+    assert stats['retries'] == pool.policy.attempts - 1 and stats['gave_up'] == 1
+
+
+def test_rejected_request_is_not_retried():
+    pool = make_pool()
+    sent = []
+
+    def job(url):
+        sent.append(url)
+        raise http_error(422)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        pool.run(job)
+    assert len(sent) == 1
+    # The server answered, so it counts as up
+    assert all(endpoint.breaker.failures == 0 and endpoint.in_flight == 0 for endpoint in pool.endpoints)
+
+
+def test_in_flight_counts_running_jobs():
+    pool = make_pool(urls=['http://a'])
+    running = threading.Event()
+    release = threading.Event()
+
+    def job(url):
+        running.set()
+        release.wait()
+
+    thread = threading.Thread(target=pool.run, args=(job,))
+    thread.start()
+    running.wait()
+    assert pool.endpoints[0].in_flight == 1
+    release.set()
+    thread.join()
+    assert pool.endpoints[0].in_flight == 0
+
+
+def test_probes_mark_servers_down_and_back_up():
+    answers = {'http://a': 3}
+
+    def probe(url):
+        if url not in answers:
+            raise requests.exceptions.ConnectionError('refused')
+        return answers[url]
+
+    pool = EndpointPool(['http://a', 'http://b'], probe, interval=.01)
+    try:
+        deadline = time.monotonic() + 1
+        while pool.endpoints[1].healthy and time.monotonic() < deadline:
+            time.sleep(.01)
+        a, b = pool.endpoints
+        assert a.healthy and a.queued == 3 and a.load == 3
+        assert not b.healthy
+
+        answers['http://b'] = 0
+        while not b.healthy and time.monotonic() < deadline:
+            time.sleep(.01)
+        assert b.healthy
+    finally:
+        pool.stop()
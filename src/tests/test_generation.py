@@ -0,0 +1,102 @@
+import concurrent.futures
+
+import pytest
+import requests
+
+from game.benchmark import SETUP_ANSWERS, StandInImageGenerator
+from game.chatbot import StoryTeller
+from game.game_types import GameState
+from game.generation import start_generation
+from game.offline_backend import OfflineBackend
+from game.retry_policy import RetryPolicy
+from game.scene_plan import GAME_FLOW, scene
+
+SCENES = [scene(name) for name in GAME_FLOW]
+
+
+class FailingBackend(OfflineBackend):
+    """Offline answers, except for requests mentioning ``trigger``."""
+
+    def __init__(self, trigger):
+        super().__init__()
+        self.trigger = trigger
+
+    def respond(self, payload, rng):
+        if self.trigger in payload[-1]['content']:
+            raise ConnectionError('chat backend down')
+        return super().respond(payload, rng)
+
+
+def game_state(tmp_path, backend=None, failure_rate=0.):
+    return GameState(
+        story_teller=StoryTeller(use_chatgpt=False, backend=backend or OfflineBackend(), bundled=True),
+        image_generator=StandInImageGenerator(tmp_path, failure_rate=failure_rate,
+                                              retry_policy=RetryPolicy(base_delay=0.)),
+        window_size=(1200, 900),
+        is_prologue=True,
+        battle_won=False,
+        setup_results=dict(SETUP_ANSWERS))
+
+
+def generate(state, warm_pool=None):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        start_generation(state, executor, SCENES, warm_pool)
+        assert state.scene_plan is not None
+        try:
+            state.generation_future.result(timeout=30)
+        finally:
+            state.image_generator.close()
+
+
+def assert_failed(state, error):
+    for index in range(len(SCENES)):
+        # A failed scene counts as ready, so the Director moves on and shows the error
+        assert state.scene_ready(index)
+        future = state.scene_plan.ready(index)
+        if future.exception() is not None:
+            assert isinstance(future.exception(), error)
+    assert any(state.scene_plan.ready(index).exception() is not None for index in range(len(SCENES)))
+    for stream in state.text_streams.values():
+        assert stream.done
+    with pytest.raises(error):
+        state.assets.future('asked for after the failure').result(timeout=0)
+
+
+def test_every_scene_becomes_ready(tmp_path):
+    state = game_state(tmp_path)
+    assert state.scene_ready(0)
+    generate(state)
+    assert all(state.scene_ready(index) for index in range(len(SCENES)))
+    assert all(state.scene_plan.ready(index).exception() is None for index in range(len(SCENES)))
+    assert set(state.text_streams) == {'prologue', 'prologue_dialogue', 'epilogue_victory_dialogue',
+                                       'epilogue_defeat_dialogue'}
+    for field, stream in state.text_streams.items():
+        assert stream.wait(timeout=0) and stream.error is None
+
+
+def test_a_failed_story_step_fails_what_is_left(tmp_path):
+    state = game_state(tmp_path, FailingBackend('lines of dialogue between'))
+    with pytest.raises(ConnectionError):
+        generate(state)
+    assert_failed(state, ConnectionError)
+    # What was made before the failure is still there
+    assert state.scene_plan.ready(GAME_FLOW.index('title')).exception() is None
+
+
+def test_a_failed_image_fails_what_is_left(tmp_path):
+    state = game_state(tmp_path, failure_rate=1.)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        generate(state)
+    assert_failed(state, requests.exceptions.ConnectionError)
+
+
+def test_a_failure_before_the_plan_runs_fails_every_scene(tmp_path):
+    class BrokenPool:
+        def take(self, story_teller, image_generator):
+            raise OSError('warm pool unreadable')
+
+    state = game_state(tmp_path)
+    with pytest.raises(OSError):
+        generate(state, BrokenPool())
+    assert_failed(state, OSError)
+    assert state.scene_plan.ready(GAME_FLOW.index('title')).exception() is not None
@@ -0,0 +1,70 @@
+import os
+import time
+
+from PIL import Image
+
+from game.benchmark import StandInImageGenerator
+from game.stable_diffusion import ImageGenerator
+
+PAYLOAD = {'prompt': 'castle, storm clouds', 'steps': 50, 'seed': 7, 'width': 512, 'height': 512}
+
+
+def test_request_key_depends_on_the_request_only():
+    key = ImageGenerator.request_key(PAYLOAD)
+    assert key == ImageGenerator.request_key(dict(reversed(list(PAYLOAD.items()))))
+    assert key != ImageGenerator.request_key(dict(PAYLOAD, seed=8))
+    assert key != ImageGenerator.request_key(PAYLOAD, no_bg=True)
+    # The matte only changes portraits that have their background removed
+    assert key == ImageGenerator.request_key(PAYLOAD, local_matte=True)
+    assert ImageGenerator.request_key(PAYLOAD, no_bg=True) != ImageGenerator.request_key(PAYLOAD, no_bg=True,
+                                                                                       local_matte=True)
+
+
+def write(path, size, age):
+    path.write_bytes(b'\0' * size)
+    used = time.time() - age
+    os.utime(path, (used, used))
+
+
+def generator(cache_dir):
+    generator = StandInImageGenerator(cache_dir)
+    generator.ready.wait()
+    return generator
+
+
+def test_evict_drops_old_then_least_recently_used(tmp_path):
+    images = generator(tmp_path)
+    write(tmp_path / 'ancient.png', 10, age=1000)
+    write(tmp_path / 'old.png', 10, age=300)
+    write(tmp_path / 'recent.png', 10, age=200)
+    write(tmp_path / 'new.png', 10, age=100)
+    images.cached('old')
+
+    images.evict(max_bytes=20, max_age=500)
+    # ancient is past max_age; recent was used longest ago of what fits, now old's been read
+    assert sorted(path.name for path in tmp_path.glob('*.png')) == ['new.png', 'old.png']
+
+
+def test_store_and_cached(tmp_path):
+    images = generator(tmp_path)
+    assert images.cached('missing') is None
+    path = images.store('abc', Image.new('RGB', (4, 4)))
+    assert path == tmp_path / 'abc.png'
+    assert images.cached('abc') == path
+    # Nothing left over from writing it aside
+    assert list(tmp_path.glob('*.tmp')) == []
+
+
+def test_a_later_session_renders_from_the_cache(tmp_path):
+    first = generator(tmp_path)
+    first.submit_background('battle', 'a lava-lit canyon').result(timeout=10)
+    first.flush()
+    first.close()
+    assert first.retry_policy.stats()['attempts'] == 1
+
+    second = generator(tmp_path)
+    img = second.submit_background('battle', 'a lava-lit canyon').result(timeout=10)
+    second.close()
+    assert img is not None
+    assert second.retry_policy.stats().get('attempts', 0) == 0
+    assert second.index['battle'] == first.index['battle']
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from game.image_scheduler import ImageScheduler
+
+
+def blocked(scheduler):
+    """Occupy the scheduler's only worker until the returned event is set."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def job():
+        started.set()
+        release.wait()
+
+    scheduler.submit('blocker', job)
+    started.wait()
+    return release
+
+
+def test_queued_jobs_run_by_deadline_then_priority_then_order():
+    scheduler = ImageScheduler(max_parallel=1)
+    release = blocked(scheduler)
+    order = []
+    jobs = [('no deadline', None, 5), ('late', 3, 0), ('soon', 1, 0), ('soon, urgent', 1, 2), ('soon, second', 1, 0)]
+    futures = [scheduler.submit(name, lambda name=name: order.append(name), priority=priority, deadline=deadline)
+               for name, deadline, priority in jobs]
+    release.set()
+    for future in futures:
+        future.result(timeout=1)
+    assert order == ['soon, urgent', 'soon', 'soon, second', 'late', 'no deadline']
+
+
+def test_an_asset_is_only_made_once():
+    scheduler = ImageScheduler(max_parallel=2)
+    calls = []
+    first = scheduler.submit('hero', lambda: calls.append(1) or 'portrait')
+    second = scheduler.submit('hero', lambda: calls.append(2) or 'other')
+    assert first is second is scheduler.future('hero')
+    assert first.result(timeout=1) == 'portrait'
+    assert calls == [1]
+    assert scheduler.future('boss') is None
+
+
+def test_failures_reach_the_future():
+    scheduler = ImageScheduler()
+
+    def fail():
+        raise ConnectionError('server down')
+
+    with pytest.raises(ConnectionError):
+        scheduler.submit('hero', fail).result(timeout=1)
+
+
+def test_runs_at_most_max_parallel_and_exits_when_idle():
+    scheduler = ImageScheduler(max_parallel=2)
+    lock = threading.Lock()
+    load = [0]
+    peak = [0]
+
+    def job():
+        with lock:
+            load[0] += 1
+            peak[0] = max(peak[0], load[0])
+        time.sleep(.05)
+        with lock:
+            load[0] -= 1
+
+    futures = [scheduler.submit(f'image {i}', job) for i in range(6)]
+    for future in futures:
+        future.result(timeout=1)
+    assert peak[0] == 2
+
+    deadline = time.monotonic() + 1
+    while scheduler.workers and time.monotonic() < deadline:
+        time.sleep(.01)
+    assert scheduler.workers == 0
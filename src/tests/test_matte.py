@@ -0,0 +1,37 @@
+import numpy as np
+from PIL import Image
+
+from game.matte import flood_from_border, remove_plain_background
+
+
+def test_flood_reaches_only_what_touches_the_border():
+    # A ring of False walls in the True pixels at its centre
+    mask = np.ones((7, 7), dtype=bool)
+    mask[1:6, 1] = mask[1:6, 5] = mask[1, 1:6] = mask[5, 1:6] = False
+    reached = flood_from_border(mask)
+    assert reached[0].all() and reached[:, 0].all()
+    assert not reached[2:5, 2:5].any()
+
+
+def test_flood_follows_winding_paths():
+    # A spiral corridor into the middle is still connected to the border
+    mask = np.zeros((5, 5), dtype=bool)
+    for row, col in [(0, 2), (1, 2), (1, 3), (2, 3), (3, 3), (3, 2), (3, 1), (2, 1)]:
+        mask[row, col] = True
+    assert (flood_from_border(mask) == mask).all()
+
+
+def test_cuts_the_subject_out_of_a_plain_backdrop():
+    pixels = np.full((32, 32, 3), 250, dtype=np.uint8)
+    pixels[8:24, 8:24] = (200, 30, 30)
+    # A pocket of backdrop colour inside the subject isn't backdrop
+    pixels[14:18, 14:18] = 250
+    alpha = np.asarray(remove_plain_background(Image.fromarray(pixels)))[..., 3]
+
+    assert (alpha[:8] == 0).all() and (alpha[:, :8] == 0).all()
+    assert (alpha[9:23, 9:23] == 255).all()
+
+
+def test_busy_border_is_left_alone():
+    pixels = np.random.default_rng(0).integers(0, 256, (32, 32, 3), dtype=np.uint8)
+    assert remove_plain_background(Image.fromarray(pixels)) is None
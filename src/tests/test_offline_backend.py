@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from game.chatbot import ACTION_FIELDS, StoryTeller
+from game.combat import DEFAULT_ATTACKS, DEFAULT_ITEMS, Action
+from game.dialogue import DialogueParser
+from game.offline_backend import OfflineBackend
+
+
+def story_teller(bundled=False, seed=0):
+    teller = StoryTeller(use_chatgpt=False, backend=OfflineBackend(seed=seed), bundled=bundled)
+    teller.add_basic_character_info('Angus McFife', 'hammer-wielding prince', 'He protects Fife.')
+    return teller
+
+
+def story(teller):
+    return {field: getattr(teller, field) for field in teller.story_fields()}
+
+
+@pytest.mark.parametrize('bundled', [False, True])
+def test_every_field_has_the_shape_the_game_reads(bundled):
+    teller = story_teller(bundled)
+    teller.generate()
+
+    for field, value in story(teller).items():
+        assert value, f'{field} is empty'
+    for field in ACTION_FIELDS:
+        actions = getattr(teller, field)
+        assert all(isinstance(action, Action) for action in actions)
+        # Answers that parse, rather than the defaults used when they don't
+        assert actions != DEFAULT_ATTACKS and actions[:2] != DEFAULT_ITEMS
+    assert len(teller.main_character_attacks) == len(teller.final_boss_attacks) == 4
+    assert len(teller.main_character_inventory) == len(teller.final_boss_inventory) == 2
+
+    parser = DialogueParser()
+    lines = parser.feed(teller.prologue_dialogue) + parser.finish()
+    assert len(lines) == 6
+    assert {speaker for speaker, _ in lines} == {'Angus McFife', teller.final_boss_name}
+    assert 'Angus McFife' in teller.prologue
+
+
+def test_answers_depend_only_on_the_payload_and_seed():
+    first, second = story_teller(), story_teller()
+    first.generate()
+    second.generate()
+    assert story(first) == story(second)
+
+    other = story_teller(seed=1)
+    other.generate(targets=['genre'])
+    # Each seed has its own entries in the story cache
+    assert other.backend.cache_id != first.backend.cache_id
+    assert other.genre != first.genre
+
+
+def test_streams_and_async_answer_the_same():
+    backend = OfflineBackend(seed=3)
+    payload = [{'role': 'user', 'content': 'Describe the appearance of the hero.'}]
+    answer = backend.complete('model', payload)
+    assert ''.join(backend.stream('model', payload)) == answer
+    assert asyncio.run(backend.acomplete('model', payload)) == answer
+
+
+def test_latency_can_be_drawn_from_a_distribution():
+    backend = OfflineBackend(latency=lambda rng: -1.)
+    assert backend.delay(backend.rng([])) == 0.
@@ -0,0 +1,145 @@
+import pytest
+import requests
+
+from game import retry_policy
+from game.endpoint_pool import EndpointPool
+from game.retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(retry_policy.time, 'monotonic', clock)
+    return clock
+
+
+def trip(breaker):
+    for _ in range(breaker.threshold):
+        assert breaker.available()
+        breaker.sending()
+        breaker.failed()
+
+
+def test_trips_after_threshold_failures_in_a_row(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=10.)
+    breaker.failed()
+    breaker.failed()
+    breaker.succeeded()
+    breaker.failed()
+    breaker.failed()
+    assert breaker.available()
+    breaker.failed()
+    assert not breaker.available()
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=10.)
+    trip(breaker)
+    clock.now += 9.
+    assert not breaker.available()
+
+    clock.now += 1.
+    assert breaker.available()
+    breaker.sending()
+    # The probe is out, so nothing else goes
+    assert not breaker.available()
+
+    breaker.succeeded()
+    assert breaker.available()
+    breaker.sending()
+    assert breaker.available()
+
+
+def test_failed_probe_reopens_for_another_cooldown(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=10.)
+    trip(breaker)
+    clock.now += 10.
+    breaker.sending()
+    breaker.failed()
+    assert not breaker.available()
+    clock.now += 10.
+    assert breaker.available()
+
+
+def test_abandoned_probe_lets_another_go(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=10.)
+    trip(breaker)
+    clock.now += 10.
+    breaker.sending()
+    assert not breaker.available()
+    breaker.abandoned()
+    assert breaker.available()
+
+
+def test_one_job_cannot_trip_the_breaker(clock):
+    policy = RetryPolicy(attempts=3, breaker_threshold=4)
+    breaker = policy.breaker()
+    for _ in range(policy.attempts):
+        breaker.sending()
+        breaker.failed()
+    assert breaker.available()
+
+    with pytest.raises(ValueError):
+        RetryPolicy(attempts=3, breaker_threshold=3)
+
+
+def test_breaker_without_fallback_trips_for_a_short_cooldown(clock):
+    policy = RetryPolicy(breaker_cooldown=30., solo_breaker_cooldown=5.)
+    breaker = policy.breaker(fallback=False)
+    trip(breaker)
+    assert not breaker.available()
+    clock.now += 5.
+    assert breaker.available()
+    assert policy.breaker().cooldown == 30.
+
+
+def test_single_server_fails_fast_once_its_breaker_opens(clock):
+    pool = EndpointPool(['http://only'], probe=lambda url: 0, policy=RetryPolicy(attempts=2, base_delay=0.,
+                                                                                    breaker_threshold=4))
+    sent = []
+
+    def job(url):
+        sent.append(url)
+        raise requests.exceptions.ConnectionError('refused')
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            pool.run(job)
+    assert len(sent) == 4
+    with pytest.raises(CircuitOpenError):
+        pool.run(job)
+    assert len(sent) == 4
+
+    # Half-open after the cooldown: the next job is sent as the probe
+    clock.now += pool.policy.solo_breaker_cooldown
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.run(job)
+    assert len(sent) == 5
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+def test_should_retry():
+    assert RetryPolicy.should_retry(requests.exceptions.ConnectionError())
+    assert RetryPolicy.should_retry(requests.exceptions.ReadTimeout())
+    assert RetryPolicy.should_retry(http_error(503))
+    assert not RetryPolicy.should_retry(http_error(400))
+    assert not RetryPolicy.should_retry(ValueError())
+
+
+def test_timeout_ignores_the_query():
+    policy = RetryPolicy()
+    assert policy.timeout('/sdapi/v1/progress?skip_current_image=false') == (5., 5.)
+    assert policy.timeout('/somewhere/else') == retry_policy.DEFAULT_TIMEOUT
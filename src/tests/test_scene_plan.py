@@ -0,0 +1,84 @@
+from game.benchmark import StandInImageGenerator
+from game.chatbot import LLM_LANE, StoryTeller
+from game.generation import image_tasks
+from game.scene_plan import GAME_FLOW, SCENE_NEEDS, ScenePlan, image_deadlines, scene
+
+SCENES = [scene(name) for name in GAME_FLOW]
+TITLE, BATTLE, EPILOGUE = (GAME_FLOW.index(name) for name in ('title', 'battle', 'epilogue cutscene'))
+
+
+def story_teller():
+    teller = StoryTeller(use_chatgpt=False, bundled=True)
+    teller.add_basic_character_info('Angus McFife', 'hammer-wielding prince', '')
+    return teller
+
+
+def build(tmp_path, teller=None):
+    teller = story_teller() if teller is None else teller
+    images = StandInImageGenerator(tmp_path)
+    plan = ScenePlan(SCENES)
+    plan.build(teller, image_tasks(teller, images, image_deadlines(SCENES)))
+    return plan
+
+
+def test_scene_table():
+    assert set(GAME_FLOW) == set(SCENE_NEEDS)
+    assert scene('battle').needs is SCENE_NEEDS['battle']
+    deadlines = image_deadlines(SCENES)
+    assert deadlines['title background'] == TITLE
+    assert deadlines['battle background'] == BATTLE
+    assert deadlines['epilogue-defeat background'] == EPILOGUE
+
+
+def test_tasks_are_ranked_by_the_first_scene_that_needs_them(tmp_path):
+    plan = build(tmp_path)
+    graph = plan.graph
+    # The title is made from the genre and tone, so those are needed by the title screen
+    assert plan.priority('create_title') == plan.priority('select_story_genre') == TITLE
+    assert plan.priority('battle background') == BATTLE
+    assert plan.priority('create_epilogue_victory_card_prompt') == EPILOGUE
+    # Nothing reads a task that's needed later than it
+    for name, dependencies in graph.dependencies.items():
+        assert all(plan.priority(dependency) <= plan.priority(name) for dependency in dependencies)
+
+
+def test_scenes_become_ready_in_playthrough_order(tmp_path):
+    plan = build(tmp_path)
+    assert plan.ready(0).done() and plan.ready(1).done()
+    assert not plan.ready(TITLE).done()
+    assert plan.progress(BATTLE)[0] == 0
+
+    ready_order = []
+    for index in range(len(SCENES)):
+        plan.ready(index).add_done_callback(lambda _, index=index: ready_order.append(index))
+    plan.run(max_workers=2, lanes={LLM_LANE: 1})
+
+    assert all(plan.ready(index).done() for index in range(len(SCENES)))
+    done, total = plan.progress(BATTLE)
+    assert done == total > 0
+    waited = [index for index in ready_order if SCENES[index].needs.fields + SCENES[index].needs.images]
+    assert waited == sorted(waited)
+
+    # Story steps start in the order of the scenes that need them
+    timings = plan.graph.timings
+    steps = sorted((name for name, task in plan.graph.tasks.items() if task.lane == LLM_LANE),
+                   key=lambda name: timings[name][0])
+    priorities = [plan.priority(name) for name in steps]
+    assert priorities == sorted(priorities)
+
+
+def test_assets_are_published_as_they_are_made(tmp_path):
+    plan = build(tmp_path)
+    plan.run(max_workers=2, lanes={LLM_LANE: 1})
+    teller = plan.story_teller
+    assert plan.assets.future('title').result(timeout=0) == teller.title
+    assert plan.assets.future('main_character_attacks').result(timeout=0) == teller.main_character_attacks
+    assert plan.assets.future('battle background').result(timeout=0) is not None
+
+
+def test_fields_the_story_has_are_not_generated_again(tmp_path):
+    teller = story_teller()
+    teller.genre, teller.tone, teller.title = 'Fantasy', 'Whimsical', 'The Legend of Fife'
+    plan = build(tmp_path, teller)
+    assert 'create_title' not in plan.graph.tasks
+    assert plan.assets.future('title').result(timeout=0) == 'The Legend of Fife'
@@ -0,0 +1,157 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+from game.task_graph import Milestone, Task, TaskGraph, critical_path
+
+
+def recorder(log, name, delay=0.):
+    def fn():
+        time.sleep(delay)
+        log.append(name)
+    return fn
+
+
+def test_runs_in_dependency_order():
+    log = []
+    graph = TaskGraph([
+        Task('c', recorder(log, 'c'), reads=('b',)),
+        Task('b', recorder(log, 'b'), reads=('a',), writes=('b',)),
+        Task('a', recorder(log, 'a'), writes=('a',)),
+    ])
+    graph.run(max_workers=4)
+    assert log == ['a', 'b', 'c']
+
+
+def test_rejects_bad_graphs():
+    with pytest.raises(ValueError, match='written by both'):
+        TaskGraph([Task('a', None, writes=('x',)), Task('b', None, writes=('x',))])
+    with pytest.raises(ValueError, match='which no task writes'):
+        TaskGraph([Task('a', None, reads=('x',))])
+    with pytest.raises(ValueError, match='cycle'):
+        TaskGraph([Task('a', None, reads=('y',), writes=('x',)), Task('b', None, reads=('x',), writes=('y',))])
+
+
+def test_for_targets_leaves_out_unneeded_and_available():
+    tasks = [
+        Task('a', None, writes=('a',)),
+        Task('b', None, reads=('a',), writes=('b',)),
+        Task('c', None, writes=('c',)),
+    ]
+    assert set(TaskGraph.for_targets(tasks, ['b']).tasks) == {'a', 'b'}
+    assert set(TaskGraph.for_targets(tasks, ['b'], available=['a']).tasks) == {'b'}
+
+
+def test_priority_orders_ready_tasks():
+    log = []
+    graph = TaskGraph([Task(name, recorder(log, name)) for name in 'abcd'])
+    graph.run(max_workers=1, priority='dcba'.index)
+    assert log == ['d', 'c', 'b', 'a']
+
+
+def test_failure_stops_later_tasks():
+    log = []
+
+    def fail():
+        raise RuntimeError('boom')
+
+    graph = TaskGraph([
+        Task('a', fail, writes=('a',)),
+        Task('b', recorder(log, 'b'), reads=('a',)),
+    ])
+    done = []
+    with pytest.raises(RuntimeError, match='boom'):
+        graph.run(max_workers=2, on_task_done=done.append)
+    assert log == [] and done == []
+
+
+def test_milestone():
+    milestone = Milestone(['a', 'b'])
+    milestone.task_done('a')
+    assert not milestone.done()
+    milestone.task_done('b')
+    assert milestone.result(timeout=0) is None
+
+    assert Milestone([]).done()
+
+    failed = Milestone(['a'])
+    failed.fail(RuntimeError('boom'))
+    failed.task_done('a')
+    with pytest.raises(RuntimeError):
+        failed.result(timeout=0)
+
+
+def test_critical_path_follows_the_last_dependency():
+    first = TaskGraph([
+        Task('fast', lambda: None, writes=('fast',)),
+        Task('slow', lambda: time.sleep(.05), writes=('slow',)),
+    ])
+    first.run(max_workers=2)
+    second = TaskGraph([Task('end', lambda: None, reads=('fast', 'slow'))], available=('fast', 'slow'))
+    second.run()
+    assert [name for name, *_ in critical_path([first, second], 'end')] == ['slow', 'end']
+
+
+def test_arun():
+    log = []
+
+    def step(name):
+        async def fn():
+            log.append(name)
+        return fn
+
+    graph = TaskGraph([Task('a', step('a'), writes=('a',)), Task('b', step('b'), reads=('a',))])
+    asyncio.run(graph.arun())
+    assert log == ['a', 'b']
+
+
+def test_returned_future_finishes_the_task_without_a_worker():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    log = []
+    graph = TaskGraph([
+        Task('a', lambda: executor.submit(time.sleep, .2), writes=('a',)),
+        Task('b', lambda: executor.submit(time.sleep, .2), writes=('b',)),
+        Task('c', recorder(log, 'c'), reads=('a', 'b')),
+    ])
+    start = time.perf_counter()
+    graph.run(max_workers=1)
+    # Both futures waited at once, though the graph only had one worker
+    assert time.perf_counter() - start < .35
+    assert log == ['c']
+    assert graph.timings['a'][1] - graph.timings['a'][0] >= .2
+
+
+def test_failed_returned_future_fails_the_run():
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def fail():
+        raise RuntimeError('render failed')
+
+    graph = TaskGraph([Task('a', lambda: executor.submit(fail))])
+    with pytest.raises(RuntimeError, match='render failed'):
+        graph.run()
+
+
+def test_lane_limits_its_tasks_only():
+    lock = threading.Lock()
+    load = {'llm': 0, None: 0}
+    peak = {'llm': 0, None: 0}
+
+    def fn(lane):
+        def run():
+            with lock:
+                load[lane] += 1
+                peak[lane] = max(peak[lane], load[lane])
+            time.sleep(.05)
+            with lock:
+                load[lane] -= 1
+        return run
+
+    tasks = [Task(f'llm {i}', fn('llm'), lane='llm') for i in range(4)]
+    tasks += [Task(f'other {i}', fn(None)) for i in range(3)]
+    TaskGraph(tasks).run(max_workers=5, lanes={'llm': 2})
+    assert peak['llm'] == 2
+    assert peak[None] == 3
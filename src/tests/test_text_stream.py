@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from game.chatbot import StoryTeller
+from game.offline_backend import OfflineBackend
+from game.text_stream import TextStream
+
+
+def test_readers_see_the_text_grow():
+    stream = TextStream()
+    stream.write('Once ')
+    assert stream.text == 'Once ' and len(stream) == 5 and not stream.done
+    stream.write('upon a time')
+    stream.close()
+    assert stream.done
+    assert stream.wait(timeout=0) == 'Once upon a time'
+
+
+def test_wait_blocks_until_closed():
+    stream = TextStream()
+
+    def write():
+        time.sleep(.05)
+        stream.write('done')
+        stream.close()
+
+    threading.Thread(target=write).start()
+    assert stream.wait(timeout=1) == 'done'
+
+
+def test_wait_times_out_with_the_text_so_far():
+    stream = TextStream()
+    stream.write('partial')
+    assert stream.wait(timeout=.01) == 'partial'
+    assert not stream.done
+
+
+def test_fail_raises_in_readers():
+    stream = TextStream()
+    stream.write('partial')
+    stream.fail(RuntimeError('backend down'))
+    assert stream.done
+    with pytest.raises(RuntimeError, match='backend down'):
+        stream.wait()
+
+
+def story_teller(backend):
+    teller = StoryTeller(use_chatgpt=False, backend=backend)
+    teller.add_basic_character_info('Angus McFife', 'hammer-wielding prince', '')
+    teller.genre, teller.tone = 'Fantasy', 'Whimsical'
+    return teller
+
+
+def test_stream_step_fills_the_stream_and_the_field():
+    teller = story_teller(OfflineBackend())
+    stream = TextStream()
+    teller.stream_step('create_prologue', stream)
+    assert stream.done
+    assert teller.prologue == stream.text
+    assert 'Angus McFife' in stream.text
+
+    # A second run is answered from the story cache in one piece
+    again = TextStream()
+    story_teller(OfflineBackend()).stream_step('create_prologue', again)
+    assert again.text == stream.text
+
+
+def test_stream_step_fails_the_stream_when_the_backend_does():
+    class Broken(OfflineBackend):
+        def stream(self, model, payload):
+            yield 'The begin'
+            raise ConnectionError('dropped')
+
+    teller = story_teller(Broken())
+    stream = TextStream()
+    with pytest.raises(ConnectionError):
+        teller.stream_step('create_prologue', stream)
+    assert stream.text == 'The begin'
+    with pytest.raises(ConnectionError):
+        stream.wait()
+    assert teller.prologue is None
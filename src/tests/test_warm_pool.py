@@ -0,0 +1,104 @@
+import json
+
+import pytest
+
+from game.benchmark import StandInImageGenerator
+from game.chatbot import ACTION_FIELDS, StoryTeller
+from game.combat import Action
+from game.generation import PERSONAL_FIELDS
+from game.warm_pool import WarmPool, pool_key
+
+
+@pytest.fixture
+def pool(tmp_path):
+    return WarmPool(tmp_path / 'pool',
+                    story_teller_factory=lambda: StoryTeller(use_chatgpt=False, bundled=True),
+                    image_generator_factory=lambda: StandInImageGenerator(tmp_path / 'images'))
+
+
+def player(genre='Fantasy epic', tone='Whimsical and bright'):
+    teller = StoryTeller(use_chatgpt=False, bundled=True)
+    teller.add_basic_character_info('Angus McFife', 'hammer-wielding prince', '')
+    teller.genre, teller.tone = genre, tone
+    return teller
+
+
+def test_pool_key():
+    assert pool_key('Fantasy, Adventure', 'Whimsical, bright') == 'fantasy-whimsical'
+    assert pool_key(None, '') == 'any-any'
+
+
+def test_a_miss_asks_the_producer_for_the_traits(pool, tmp_path):
+    assert not pool.take(player(), StandInImageGenerator(tmp_path / 'images'))
+    assert pool.keys() == ['fantasy-whimsical']
+    assert pool.next_key() == 'fantasy-whimsical'
+
+
+def test_take_loads_a_produced_game_for_the_player(pool, tmp_path):
+    pool.want('Fantasy', 'Whimsical')
+    pool.produce('fantasy-whimsical')
+    [entry] = pool.entries('fantasy-whimsical')
+    saved = json.loads((entry / 'story.json').read_text())
+    placeholder = saved['player_name']
+
+    teller = player()
+    images = StandInImageGenerator(tmp_path / 'images')
+    assert pool.take(teller, images)
+    # Claimed games are used up
+    assert pool.entries('fantasy-whimsical') == []
+    assert list(pool.claimed.iterdir()) == []
+
+    for field in saved['fields']:
+        value = getattr(teller, field)
+        assert value is not None
+        if field in ACTION_FIELDS:
+            assert all(isinstance(action, Action) for action in value)
+        elif isinstance(value, str):
+            assert placeholder.split()[0] not in value
+    assert 'Angus McFife' in teller.prologue
+    # The dialogue is written for the player when the game starts
+    assert all(getattr(teller, field) is None for field in PERSONAL_FIELDS)
+
+    assert 'Angus McFife' in images.image_objects and placeholder not in images.image_objects
+    assert all(path.exists() for path in images.index.values())
+    assert images.image('battle') is not None
+
+
+def test_personalise_replaces_the_first_name_on_its_own(pool, tmp_path):
+    entry = pool.directory / 'fantasy-whimsical' / 'game'
+    entry.mkdir(parents=True)
+    (entry / 'story.json').write_text(json.dumps({
+        'player_name': 'Rowan Ashby',
+        'fields': {'prologue': 'Rowan Ashby rode out. Rowan never looked back, unlike Rowanna.',
+                   'main_character_attacks': [{'name': 'Strike', 'damage': 100, 'description': 'Hits',
+                                               'accuracy': 90}]},
+        'images': {'Rowan Ashby': {'descriptors': ['Rowan in a red cloak'], 'seed': 3, 'key': None}},
+    }))
+    teller = player()
+    images = StandInImageGenerator(tmp_path / 'images')
+    assert pool.take(teller, images)
+    assert teller.prologue == 'Angus McFife rode out. Angus McFife never looked back, unlike Rowanna.'
+    assert teller.main_character_attacks == [Action('Strike', 100, 'Hits', 90)]
+    assert images.image_objects['Angus McFife'].descriptors == ['Angus McFife in a red cloak']
+    assert images.image_objects['Angus McFife'].seed == 3
+
+
+@pytest.mark.parametrize('story', [
+    '{"player_name": "Rowan',
+    json.dumps({'player_name': 'Rowan Ashby', 'fields': {}}),
+    json.dumps({'player_name': 'Rowan Ashby', 'fields': {'prologue': 'Rowan'},
+                'images': {'battle': {'descriptors': ['lava'], 'seed': 1, 'key': 'gone'}}}),
+])
+def test_a_game_that_wont_load_is_discarded(pool, tmp_path, story):
+    entry = pool.directory / 'fantasy-whimsical' / 'broken'
+    entry.mkdir(parents=True)
+    (entry / 'story.json').write_text(story)
+
+    teller = player()
+    images = StandInImageGenerator(tmp_path / 'images')
+    assert not pool.take(teller, images)
+    assert pool.entries('fantasy-whimsical') == []
+    assert list(pool.claimed.iterdir()) == []
+    # Nothing from the broken game is left behind
+    assert teller.prologue is None
+    assert images.image_objects == {} and images.index == {}